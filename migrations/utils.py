@@ -1,20 +1,111 @@
+import re
+from weakref import WeakKeyDictionary
+
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
 
+_enum_names: WeakKeyDictionary = WeakKeyDictionary()
+_preparer = postgresql.dialect().identifier_preparer
+_IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*\Z")
 
-def check_enum_exists(op, enum_name: str) -> bool:
+_ENUM_TYPES = (
+    "pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace "
+    "WHERE t.typtype = 'e' AND n.nspname = ANY(current_schemas(false))"
+)
+
+
+def _quote_identifier(name: str) -> str:
+    if not _IDENT_RE.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return _preparer.quote(sa.sql.quoted_name(name, quote=None))
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _create_enum_block(enum_name: str, enum_values: list[str]) -> str:
+    enum_values_str = ", ".join(_quote_literal(value) for value in enum_values)
+    return (
+        f"IF NOT EXISTS (SELECT 1 FROM {_ENUM_TYPES} "
+        f"AND t.typname = {_quote_literal(enum_name)}) THEN "
+        f"CREATE TYPE {_quote_identifier(enum_name)} AS ENUM ({enum_values_str}); "
+        "END IF; "
+    )
+
+
+def enum_ddl(enum_name: str, enum_values: list[str]) -> str:
+    return f"DO $$ BEGIN {_create_enum_block(enum_name, enum_values)}END $$;"
+
+
+def drop_enum_ddl(enum_name: str) -> str:
+    return (
+        "DO $$ BEGIN "
+        f"IF EXISTS (SELECT 1 FROM {_ENUM_TYPES} "
+        f"AND t.typname = {_quote_literal(enum_name)}) THEN "
+        f"DROP TYPE {_quote_identifier(enum_name)} CASCADE; "
+        "END IF; "
+        "END $$;"
+    )
+
+
+def _clear_enum_names(connection) -> None:
+    _enum_names.pop(connection, None)
+
+
+def load_enum_names(op) -> set[str]:
     connection = op.get_bind()
-    result = connection.execute(
-        sa.text(f"SELECT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{enum_name}')")
+    enum_names = _enum_names.get(connection)
+    if enum_names is None:
+        result = connection.execute(sa.text(f"SELECT t.typname FROM {_ENUM_TYPES}"))
+        enum_names = _enum_names[connection] = {row[0] for row in result}
+        if not event.contains(connection, "commit", _clear_enum_names):
+            event.listen(connection, "commit", _clear_enum_names)
+            event.listen(connection, "rollback", _clear_enum_names)
+    return enum_names
+
+
+def check_enum_exists(op, enum_name: str) -> bool:
+    enum_names = load_enum_names(op)
+    if enum_name in enum_names:
+        return True
+    # misses aren't trusted, op.create_table can create the type behind our back
+    result = op.get_bind().execute(
+        sa.text(
+            f"SELECT EXISTS (SELECT 1 FROM {_ENUM_TYPES} AND t.typname = :enum_name)"
+        ),
+        {"enum_name": enum_name},
     )
-    return result.scalar()
+    exists = result.scalar()
+    if exists:
+        enum_names.add(enum_name)
+    return exists
 
 
 def create_enum_if_not_exists(op, enum_name: str, enum_values: list[str]) -> None:
-    if not check_enum_exists(op, enum_name):
-        enum_values_str = "', '".join(enum_values)
-        op.execute(f"CREATE TYPE {enum_name} AS ENUM ('{enum_values_str}')")
+    op.execute(sa.text(enum_ddl(enum_name, enum_values)))
+    load_enum_names(op).add(enum_name)
+
+
+def create_enums_bulk(op, enums: dict[str, list[str]]) -> None:
+    enum_names = load_enum_names(op)
+    missing = {
+        enum_name: enum_values
+        for enum_name, enum_values in enums.items()
+        if enum_name not in enum_names
+    }
+    if not missing:
+        return
+    # each type stays guarded, so a stale cache can't make this fail
+    blocks = "".join(
+        _create_enum_block(enum_name, enum_values)
+        for enum_name, enum_values in missing.items()
+    )
+    op.execute(sa.text(f"DO $$ BEGIN {blocks}END $$;"))
+    enum_names.update(missing)
 
 
 def drop_enum_if_exists(op, enum_name: str) -> None:
-    if check_enum_exists(op, enum_name):
-        op.execute(f"DROP TYPE {enum_name} CASCADE")
+    op.execute(sa.text(drop_enum_ddl(enum_name)))
+    load_enum_names(op).discard(enum_name)
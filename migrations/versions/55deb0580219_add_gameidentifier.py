@@ -10,7 +10,6 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 import sqlalchemy.dialects.postgresql.named_types as pg_types
-from migrations.utils import check_enum_exists
 
 
 # revision identifiers, used by Alembic.
@@ -19,14 +18,17 @@ down_revision: Union[str, Sequence[str], None] = 'f656453a42e9'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+apisource = pg_types.ENUM('NFL_DATA_PY', 'ESPN_V2', name='apisource', create_type=False)
+
 
 def upgrade() -> None:
     """Upgrade schema."""
+    apisource.create(op.get_bind(), checkfirst=True)
     # ### commands auto generated by Alembic - please adjust! ###
     op.create_table('game_identifier',
     sa.Column('id', sa.BigInteger(), nullable=False),
     sa.Column('game_id', sa.String(), nullable=False),
-    sa.Column('source', pg_types.ENUM('NFL_DATA_PY', 'ESPN_V2', name='apisource', create_type=not check_enum_exists(op, 'apisource')), nullable=False),
+    sa.Column('source', apisource, nullable=False),
     sa.Column('external_id', sa.String(), nullable=False),
     sa.ForeignKeyConstraint(['game_id'], ['game.id'], ),
     sa.PrimaryKeyConstraint('id'),
@@ -0,0 +1,38 @@
+"""add celery result tables
+
+Revision ID: a1c3e7f2b9d4
+Revises: e545c69bfb00
+Create Date: 2026-10-14 10:12:41.503118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from celery.backends.database.models import ResultModelBase, Task, TaskSet
+
+# revision identifiers, used by Alembic.
+revision: str = "a1c3e7f2b9d4"
+down_revision: Union[str, Sequence[str], None] = "e545c69bfb00"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Workers created these tables at startup before, so only create missing ones.
+    ResultModelBase.metadata.create_all(
+        bind=op.get_bind(),
+        tables=[Task.__table__, TaskSet.__table__],
+        checkfirst=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    ResultModelBase.metadata.drop_all(
+        bind=op.get_bind(),
+        tables=[Task.__table__, TaskSet.__table__],
+        checkfirst=True,
+    )
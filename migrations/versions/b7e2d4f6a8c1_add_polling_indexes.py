@@ -0,0 +1,42 @@
+"""add polling indexes
+
+Revision ID: b7e2d4f6a8c1
+Revises: a1c3e7f2b9d4
+Create Date: 2026-10-14 15:40:12.284901
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e2d4f6a8c1"
+down_revision: Union[str, Sequence[str], None] = "a1c3e7f2b9d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_game_kickoff", "game", ["kickoff"])
+    op.create_index(
+        "ix_poll_open",
+        "poll",
+        ["game_id"],
+        postgresql_where=sa.text("NOT closed"),
+    )
+    op.create_index(
+        "ix_state_message_pending",
+        "state_message",
+        ["id"],
+        postgresql_where=sa.text("state != 'RESULT_POSTED'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_state_message_pending", table_name="state_message")
+    op.drop_index("ix_poll_open", table_name="poll")
+    op.drop_index("ix_game_kickoff", table_name="game")
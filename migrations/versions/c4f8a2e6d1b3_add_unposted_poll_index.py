@@ -0,0 +1,33 @@
+"""add unposted poll index
+
+Revision ID: c4f8a2e6d1b3
+Revises: b7e2d4f6a8c1
+Create Date: 2026-10-14 16:21:07.913540
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c4f8a2e6d1b3"
+down_revision: Union[str, Sequence[str], None] = "b7e2d4f6a8c1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_poll_unposted",
+        "poll",
+        ["channel_id"],
+        postgresql_where=sa.text("message_id IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_poll_unposted", table_name="poll")
@@ -0,0 +1,50 @@
+"""add bet and identifier indexes
+
+Revision ID: d9a3c5e7f1b2
+Revises: c4f8a2e6d1b3
+Create Date: 2026-10-14 18:42:31.205117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d9a3c5e7f1b2"
+down_revision: Union[str, Sequence[str], None] = "c4f8a2e6d1b3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_bet_game_channel",
+            "bet",
+            ["game_id", "channel_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_game_identifier_game",
+            "game_identifier",
+            ["game_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_game_identifier_game",
+            table_name="game_identifier",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_bet_game_channel", table_name="bet", postgresql_concurrently=True
+        )
@@ -0,0 +1,42 @@
+"""generate game outcome from result
+
+Revision ID: e2b6d8f0a4c7
+Revises: d9a3c5e7f1b2
+Create Date: 2026-10-14 19:58:12.640381
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e2b6d8f0a4c7"
+down_revision: Union[str, Sequence[str], None] = "d9a3c5e7f1b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OUTCOME_EXPRESSION = (
+    "CASE WHEN result IS NULL THEN 'NOT_FINISHED'::outcome "
+    "WHEN result = 0 THEN 'TIE'::outcome "
+    "WHEN result < 0 THEN 'AWAY'::outcome "
+    "ELSE 'HOME'::outcome END"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_column("game", "outcome")
+    op.execute(
+        "ALTER TABLE game ADD COLUMN outcome outcome "
+        f"GENERATED ALWAYS AS ({OUTCOME_EXPRESSION}) STORED NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("game", "outcome")
+    op.execute(
+        "ALTER TABLE game ADD COLUMN outcome outcome NOT NULL DEFAULT 'NOT_FINISHED'"
+    )
+    op.execute(f"UPDATE game SET outcome = {OUTCOME_EXPRESSION}")
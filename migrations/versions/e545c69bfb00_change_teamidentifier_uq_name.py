@@ -11,8 +11,6 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 import sqlalchemy.dialects.postgresql.named_types as pg_types
-from migrations.utils import check_enum_exists
-
 
 # revision identifiers, used by Alembic.
 revision: str = "e545c69bfb00"
@@ -0,0 +1,36 @@
+from celery.beat import PersistentScheduler
+
+
+class HeapCachedScheduler(PersistentScheduler):
+    # Only rebuild the heap when the schedule was actually modified instead of
+    # comparing every entry on each tick.
+    _heap_invalidated = True
+
+    def invalidate_heap(self):
+        self._heap_invalidated = True
+
+    def populate_heap(self, *args, **kwargs):
+        super().populate_heap(*args, **kwargs)
+        self._heap_invalidated = False
+
+    def schedules_equal(self, old_schedules, new_schedules):
+        return not self._heap_invalidated
+
+    def add(self, **kwargs):
+        entry = super().add(**kwargs)
+        self.invalidate_heap()
+        return entry
+
+    def update_from_dict(self, dict_):
+        super().update_from_dict(dict_)
+        self.invalidate_heap()
+
+    def merge_inplace(self, b):
+        super().merge_inplace(b)
+        self.invalidate_heap()
+
+    def set_schedule(self, schedule):
+        super().set_schedule(schedule)
+        self.invalidate_heap()
+
+    schedule = property(PersistentScheduler.get_schedule, set_schedule)
@@ -2,27 +2,73 @@ from otterball_nfl import settings
 from celery.schedules import crontab
 
 broker_url = settings.CELERY_BROKER_URL
-result_backend = "db+" + settings.DB_CONNECTION_STRING
+broker_pool_limit = 10
+broker_connection_retry_on_startup = True
+broker_heartbeat = 30
+result_backend = settings.CELERY_RESULT_BACKEND
 
-task_serializer = "json"
-result_serializer = "json"
-accept_content = ["json"]
+task_serializer = "msgpack"
+result_serializer = "msgpack"
+accept_content = ["msgpack", "json"]
+task_ignore_result = True
+task_acks_late = True
+task_reject_on_worker_lost = True
+worker_prefetch_multiplier = 1
 timezone = "Europe/Berlin"
 enable_utc = True
-database_create_tables_at_setup = True
+database_create_tables_at_setup = False
+# Before the worker forks, Celery's database backend drops every "pool*" option
+# and uses a NullPool. These only take effect in the forked pool processes,
+# where all options are passed to create_engine.
+database_engine_options = {
+    "pool_size": 10,
+    "pool_timeout": 30,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+}
+
+beat_scheduler = "otterball_nfl.beat:HeapCachedScheduler"
+# Keep the beat state on tmpfs. It is lost on container restarts, which only
+# means the crontab entries are recomputed from scratch.
+beat_schedule_filename = "/dev/shm/otterball-celerybeat-schedule"
+beat_max_loop_interval = 15
+
+# update_games runs on even minutes (:02, :08, ..., :56) and update_scores on
+# odd ones (:01, :03, ...), so they never coincide with each other or with
+# create_polls at :00.
+_ENTRIES = (
+    (
+        "update-games-every-six-minutes",
+        "otterball_nfl.tasks.update_games",
+        crontab(minute="2-59/6"),
+        (2025,),
+        {"expires": 60},
+    ),
+    (
+        "update-game_scores-every-two-minutes",
+        "otterball_nfl.tasks.update_scores",
+        crontab(minute="1-59/2"),
+        (),
+        {"expires": 60},
+    ),
+    (
+        "create-new-polls-every-wednesday",
+        "otterball_nfl.tasks.create_polls",
+        crontab(day_of_week="wednesday", hour="18", minute="0"),
+        (),
+        {},
+    ),
+)
 
+# The frequent entries expire so late runs don't pile up behind each other,
+# the weekly create_polls run must never be dropped.
 beat_schedule = {
-    "update-games-every-five-minutes": {
-        "task": "otterball_nfl.tasks.update_games",
-        "schedule": crontab(minute="*/5"),
-        "args": (2025,),
-    },
-    "update-game_scores-every-two-minutes": {
-        "task": "otterball_nfl.tasks.update_scores",
-        "schedule": crontab(minute="*/2"),
-    },
-    "create-new-polls-every-wednesday": {
-        "task": "otterball_nfl.tasks.create_polls",
-        "schedule": crontab(day_of_week="wednesday", hour="18", minute="0"),
-    },
+    name: {
+        "task": task,
+        "schedule": schedule,
+        "args": args,
+        "kwargs": {},
+        "options": options,
+    }
+    for name, task, schedule, args, options in _ENTRIES
 }
@@ -1,6 +1,11 @@
+import asyncio
 import datetime
+import itertools
 import logging
-from zoneinfo import ZoneInfo
+import random
+import time
+import typing
+from pathlib import Path
 
 import settings
 
@@ -13,11 +18,14 @@ import nfl_data_py as nfl
 import httpx
 import sqlalchemy
 import pandas as pd
+import psycopg2
+import psycopg2.extensions
 from discord import HTTPException
 from discord.ext import tasks
 from discord.poll import PollMedia
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, update, func, literal, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, joinedload
 
 import models
 from sqlalchemy import create_engine
@@ -25,140 +33,262 @@ from sqlalchemy import create_engine
 logger = logging.getLogger("mybot")
 logger.setLevel(settings.LOG_LEVEL)
 
+UTC = datetime.timezone.utc
+
+
+def cached_team_desc() -> pd.DataFrame:
+    path = Path(settings.TEAM_DESC_CACHE).expanduser()
+    if (
+        path.exists()
+        and time.time() - path.stat().st_mtime < settings.TEAM_DESC_CACHE_TTL
+    ):
+        return pd.read_parquet(path)
+    df = nfl.import_team_desc()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(path)
+    except OSError as e:
+        logger.warning(f"Could not cache team descriptions: {e}")
+    return df
+
 
 class MyClient(discord.Client):
     db: sqlalchemy.engine.Engine
 
     def __init__(self, db_engine: sqlalchemy.engine.Engine, *args, **kwargs):
         self.db = db_engine
+        self._sync_sem = asyncio.Semaphore(8)
+        self._emoji_cache: dict[int, discord.Emoji] = {}
+        self._msg_cache: dict[int, tuple[float, discord.Message]] = {}
+        self._delete_result_channels: frozenset[int] = frozenset()
+        self._http = httpx.AsyncClient(follow_redirects=True, timeout=10)
+        self._teams_df: pd.DataFrame | None = None
+        self._listen_conn: psycopg2.extensions.connection | None = None
+        self._results_lock = asyncio.Lock()
+        self._result_tasks: set[asyncio.Task] = set()
         super().__init__(*args, **kwargs)
 
+    async def close(self) -> None:
+        self.stop_listening_for_results()
+        await self._http.aclose()
+        await super().close()
+
     async def upgrade_result_to_status(self):
-        channels: set[discord.TextChannel] = set()
         poll_messages: dict[int, int] = {}  # message_id: poll.id
+        oldest_poll_messages: dict[int, int] = {}  # channel.id: message_id
+        state_messages: dict[int, int] = {}  # state_message.id: poll.id
 
         with Session(self.db) as session:
-            stmt = select(models.Channel).where(models.Channel.active == True)
-            for db_channel in session.scalars(stmt).all():
-                channels.add(await self.fetch_channel(db_channel.id))
-
             stmt = (
                 select(models.Poll)
+                .join(models.Channel)
+                .where(models.Channel.active == True)
                 .where(models.Poll.message_id != None)
                 .where(models.Poll.result_posted == True)
                 .where(models.Poll.state_message_id == None)
             )
             for db_poll in session.scalars(stmt).all():
                 poll_messages[db_poll.message_id] = db_poll.id
+                oldest_poll_messages[db_poll.channel_id] = min(
+                    db_poll.message_id,
+                    oldest_poll_messages.get(db_poll.channel_id, db_poll.message_id),
+                )
+
+        # Replies are always newer than the poll they reference, so only the
+        # history after the oldest poll message has to be scanned.
+        for channel_id, message_id in oldest_poll_messages.items():
+            channel = await self.get_or_fetch_channel(channel_id)
+            async for message in channel.history(
+                limit=None,
+                after=discord.Object(id=message_id),
+                oldest_first=False,
+            ):
+                if message.type == discord.MessageType.reply:
+                    poll_id = poll_messages.get(message.reference.message_id)
+                    if poll_id is None:
+                        continue
+                    state_messages[message.id] = poll_id
 
-            for channel in channels:
-                async for message in channel.history(limit=None):
-                    if message.type == discord.MessageType.reply:
-                        poll_id = poll_messages.get(message.reference.message_id)
-                        if poll_id is None:
-                            continue
-                        state_msg = session.get(models.StateMessage, message.id)
-                        if not state_msg:
-                            state_msg = models.StateMessage(
-                                id=message.id,
-                                state=models.StateMessageState.RESULT_POSTED,
-                            )
-                            session.add(state_msg)
-                            db_poll = session.get(models.Poll, poll_id)
-                            db_poll.state_message_id = state_msg.id
+        if not state_messages:
+            return
+
+        with Session(self.db) as session:
+            stmt = select(models.StateMessage.id).where(
+                models.StateMessage.id.in_(list(state_messages))
+            )
+            for state_message_id in session.scalars(stmt).all():
+                state_messages.pop(state_message_id)
+
+            if state_messages:
+                session.execute(
+                    insert(models.StateMessage)
+                    .values(
+                        [
+                            {
+                                "id": state_message_id,
+                                "state": models.StateMessageState.RESULT_POSTED,
+                            }
+                            for state_message_id in state_messages
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                )
+                db_polls: dict[int, models.Poll] = {
+                    db_poll.id: db_poll
+                    for db_poll in session.scalars(
+                        select(models.Poll).where(
+                            models.Poll.id.in_(list(state_messages.values()))
+                        )
+                    ).all()
+                }
+                for state_message_id, poll_id in state_messages.items():
+                    db_polls[poll_id].state_message_id = state_message_id
 
             session.commit()
 
+    def load_delete_result_channels(self, session: Session):
+        stmt = select(models.Channel.id).where(models.Channel.delete_result_msg == True)
+        self._delete_result_channels = frozenset(session.scalars(stmt).all())
+
     async def setup_hook(self) -> None:
+        with Session(self.db) as session:
+            self.load_delete_result_channels(session)
+        await self.listen_for_results()
         self.precache_emojis.start()
         self.close_polls.start()
-        self.create_new_polls.start()
-        self.post_results.start()
+        self.poll_tick.start()
         self.sync_bets.start()
         self.sync_state_messages.start()
-
-    async def sync_poll_bets(self, db_poll_id):
+        self.cleanup_pins.start()
+
+    async def sync_poll_bets(self, db_poll_id, force: bool = False):
+        async with self._sync_sem:
+            await self._sync_poll_bets(db_poll_id, force)
+
+    @staticmethod
+    async def _collect_answer_voters(answer: discord.PollAnswer):
+        if answer.vote_count == 0:
+            return []
+        return [voter async for voter in answer.voters()]
+
+    async def collect_voters(self, poll: discord.Poll):
+        return await asyncio.gather(
+            *(self._collect_answer_voters(answer) for answer in poll.answers)
+        )
+
+    async def _safe_sync(self, db_poll_id, force: bool = False):
+        try:
+            await self.sync_poll_bets(db_poll_id, force)
+        except Exception as e:
+            logger.error(e)
+
+    async def _sync_poll_bets(self, db_poll_id, force: bool = False):
         with Session(self.db) as session:
             db_poll: models.Poll | None = session.get(models.Poll, db_poll_id)
             if not db_poll:
                 raise Exception("Poll not found")
-            channel = await self.get_or_fetch_channel(db_poll.channel_id)
-            message = await channel.fetch_message(db_poll.message_id)
-            poll = message.poll
-            voter_ids: set[int] = set()
-            for answer in poll.answers:
-                async for voter in answer.voters():
-                    voter_ids.add(voter.id)
-                    db_user = session.get(models.User, voter.id)
-                    if not db_user:
-                        db_user = models.User(id=voter.id, username=voter.name)
-                        session.add(db_user)
-                    stmt = (
-                        select(models.Bet)
-                        .where(models.Bet.user_id == voter.id)
-                        .where(models.Bet.game_id == db_poll.game_id)
-                        .where(models.Bet.channel_id == db_poll.channel_id)
+            game_id, channel_id = db_poll.game_id, db_poll.channel_id
+            message_id = db_poll.message_id
+            stmt = (
+                select(models.Bet.choice, func.count())
+                .where(models.Bet.game_id == game_id)
+                .where(models.Bet.channel_id == channel_id)
+                .group_by(models.Bet.choice)
+            )
+            bet_counts = dict(session.execute(stmt).all())
+
+        channel = await self.get_or_fetch_channel(channel_id)
+        message = await self.get_or_fetch_message(channel, message_id)
+        poll = message.poll
+        # Matching tallies can still hide two users swapping votes, so the final
+        # sync after a poll closes (force) always pages through the voters.
+        if not force and all(
+            answer.vote_count == bet_counts.get(models.Outcome(answer.id - 1), 0)
+            for answer in poll.answers
+        ):
+            return
+        choices: dict[int, models.Outcome] = {}
+        usernames: dict[int, str] = {}
+        for answer, voters in zip(poll.answers, await self.collect_voters(poll)):
+            for voter in voters:
+                choices[voter.id] = models.Outcome(answer.id - 1)
+                usernames[voter.id] = voter.name
+
+        with Session(self.db) as session:
+            if choices:
+                session.execute(
+                    insert(models.User)
+                    .values(
+                        [
+                            {"id": user_id, "username": username}
+                            for user_id, username in usernames.items()
+                        ]
                     )
-                    db_bet = session.scalars(stmt).first()
-                    if db_bet:
-                        db_bet.choice = answer.id - 1
-                    else:
-                        db_bet = models.Bet(
-                            user_id=voter.id,
-                            game_id=db_poll.game_id,
-                            channel_id=db_poll.channel_id,
-                            choice=answer.id - 1,
-                        )
-                        session.add(db_bet)
+                    .on_conflict_do_nothing()
+                )
+                stmt = insert(models.Bet).values(
+                    [
+                        {
+                            "user_id": user_id,
+                            "game_id": game_id,
+                            "channel_id": channel_id,
+                            "choice": choice,
+                        }
+                        for user_id, choice in choices.items()
+                    ]
+                )
+                session.execute(
+                    stmt.on_conflict_do_update(
+                        constraint="uq_bet_user_game_channel",
+                        set_={"choice": stmt.excluded.choice},
+                    )
+                )
 
-            stmt = (
-                select(models.Bet)
-                .where(models.Bet.game_id == db_poll.game_id)
-                .where(models.Bet.channel_id == db_poll.channel_id)
-                .where(models.Bet.user_id.notin_(voter_ids))
+            session.execute(
+                delete(models.Bet)
+                .where(models.Bet.game_id == game_id)
+                .where(models.Bet.channel_id == channel_id)
+                .where(models.Bet.user_id.notin_(list(choices)))
             )
-            for deleted_bet in session.scalars(stmt).all():
-                session.delete(deleted_bet)
 
             session.commit()
 
     async def post_state_message_starting_soon(self):
+        now = datetime.datetime.now(UTC)
         with Session(self.db) as session:
             stmt = (
                 select(models.Poll)
                 .join(models.Game)
                 .join(models.Channel)
                 .where(
-                    models.Game.kickoff.between(
-                        datetime.datetime.now(ZoneInfo("UTC")),
-                        datetime.datetime.now(ZoneInfo("UTC"))
-                        + datetime.timedelta(hours=1),
-                    )
+                    models.Game.kickoff.between(now, now + datetime.timedelta(hours=1))
                 )
                 .where(models.Poll.closed == False)
                 .where(models.Channel.active == True)
                 .where(models.Poll.state_message_id == None)
+                .options(
+                    joinedload(models.Poll.channel),
+                    joinedload(models.Poll.game).joinedload(models.Game.home_team),
+                    joinedload(models.Poll.game).joinedload(models.Game.away_team),
+                )
             )
             for db_poll in session.scalars(stmt).all():
                 try:
                     db_poll: models.Poll
                     db_channel: models.Channel = db_poll.channel
                     channel = await self.get_or_fetch_channel(db_channel.id)
-                    poll_message = await channel.fetch_message(db_poll.message_id)
+                    poll_message = await self.get_or_fetch_message(
+                        channel, db_poll.message_id
+                    )
                     poll: discord.Poll = poll_message.poll
                     role: discord.Role = channel.guild.get_role(db_channel.role_id)
 
-                    role_members: set[discord.Member] = set(role.members)
-                    for member in role_members:
-                        if member.id == self.user.id:
-                            role_members.remove(member)
-                            break
-                    for answer in poll.answers:
-                        async for voter in answer.voters():
-                            for role_member in role_members:
-                                if role_member.id == voter.id:
-                                    role_members.remove(role_member)
-                                    break
+                    voter_ids: set[int] = {self.user.id}
+                    for voters in await self.collect_voters(poll):
+                        voter_ids.update(voter.id for voter in voters)
+                    role_members = [
+                        member for member in role.members if member.id not in voter_ids
+                    ]
                     db_game: models.Game = db_poll.game
                     text = f"# {db_game.message_title}"
                     text += f"\nReminder: Kickoff is <t:{int(db_game.kickoff.timestamp())}:R>. Last chance to get your votes in!"
@@ -183,43 +313,56 @@ class MyClient(discord.Client):
             session.commit()
 
     async def state_message_in_progress(self):
+        now = datetime.datetime.now(UTC)
         with Session(self.db) as session:
             stmt = (
                 select(models.Poll)
                 .join(models.Game)
                 .where(
-                    models.Game.kickoff.between(
-                        datetime.datetime.now(ZoneInfo("UTC"))
-                        - datetime.timedelta(hours=12),
-                        datetime.datetime.now(ZoneInfo("UTC")),
-                    )
+                    models.Game.kickoff.between(now - datetime.timedelta(hours=12), now)
                 )
                 .where(models.Game.outcome == models.Outcome.NOT_FINISHED)
+                .options(
+                    joinedload(models.Poll.state_message),
+                    joinedload(models.Poll.game).joinedload(models.Game.home_team),
+                    joinedload(models.Poll.game).joinedload(models.Game.away_team),
+                    joinedload(models.Poll.game).joinedload(models.Game.gametype),
+                )
             )
-            for db_poll in session.scalars(stmt).all():
+            db_polls = session.scalars(stmt).all()
+            if not db_polls:
+                return
+            scalings: dict[tuple[int, str], int] = {
+                (channel_id, gametype_id): factor
+                for channel_id, gametype_id, factor in session.execute(
+                    select(
+                        models.GameTypeScaling.channel_id,
+                        models.GameTypeScaling.gametype_id,
+                        models.GameTypeScaling.factor,
+                    )
+                ).all()
+            }
+            for db_poll in db_polls:
                 try:
                     db_poll: models.Poll
                     channel = await self.get_or_fetch_channel(db_poll.channel_id)
                     db_state_message: models.StateMessage = db_poll.state_message
                     db_game: models.Game = db_poll.game
                     db_game_type: models.GameType = db_game.gametype
-                    db_scaling: models.GameTypeScaling | None = session.get(
-                        entity=models.GameTypeScaling,
-                        ident=(db_poll.channel_id, db_game.gametype_id),
-                    )
+                    factor = scalings.get((db_poll.channel_id, db_game.gametype_id), 1)
                     home_team: models.Team = db_game.home_team
                     away_team: models.Team = db_game.away_team
                     leading_team: models.Team | None = db_game.leading_team
                     # text = f"# {home_team_emoji} {home_team.name} - {away_team.name} {away_team_emoji}"
                     embed = discord.Embed(
                         title="**Current Score**",
-                        description=f"{db_game_type.name} ({db_scaling.factor} Otter Point{'' if db_scaling.factor == 1 else 's'})",
+                        description=f"{db_game_type.name} ({factor} Otter Point{'' if factor == 1 else 's'})",
                         color=(
                             discord.Colour.from_str(leading_team.color)
                             if leading_team
                             else discord.Colour.blue()
                         ),
-                        timestamp=datetime.datetime.now(ZoneInfo("UTC")),
+                        timestamp=datetime.datetime.now(UTC),
                     )
                     embed.set_footer(text="Scores may take a few minutes to update")
                     if leading_team:
@@ -265,12 +408,12 @@ class MyClient(discord.Client):
 
     @tasks.loop(minutes=60)
     async def precache_emojis(self):
+        # rebuilt every run so new or renamed application emojis are picked up
+        await self.cache_application_emojis()
         with Session(self.db) as session:
             stmt = select(models.Team).where(models.Team.emoji_id != None)
             for db_team in session.scalars(stmt).all():
-                db_team.emoji_str = str(
-                    await self.fetch_application_emoji(db_team.emoji_id)
-                )
+                db_team.emoji_str = str(await self.get_or_fetch_emoji(db_team.emoji_id))
             session.commit()
 
     @precache_emojis.before_loop
@@ -279,17 +422,10 @@ class MyClient(discord.Client):
 
     @tasks.loop(minutes=5)
     async def sync_bets(self):
-        db_polls: list[models.Poll] = []
         with Session(self.db) as session:
-            stmt = select(models.Poll).where(models.Poll.closed == False)
-            for db_poll in session.scalars(stmt).all():
-                db_polls.append(db_poll)
-        for db_poll in db_polls:
-            try:
-                await self.sync_poll_bets(db_poll.id)
-            except Exception as e:
-                logger.error(e)
-                continue
+            stmt = select(models.Poll.id).where(models.Poll.closed == False)
+            poll_ids = session.scalars(stmt).all()
+        await asyncio.gather(*(self._safe_sync(poll_id) for poll_id in poll_ids))
 
     @sync_bets.before_loop
     async def before_sync_bets(self):
@@ -297,260 +433,411 @@ class MyClient(discord.Client):
 
     async def post_poll(self, poll_id: int):
         with Session(self.db) as session:
-            db_poll: models.Poll | None = session.get(models.Poll, poll_id)
-            db_channel: models.Channel | None = session.get(
-                models.Channel, db_poll.channel_id
+            stmt = (
+                select(models.Poll)
+                .where(models.Poll.id == poll_id)
+                .options(
+                    joinedload(models.Poll.game).joinedload(models.Game.home_team),
+                    joinedload(models.Poll.game).joinedload(models.Game.away_team),
+                    joinedload(models.Poll.game).joinedload(models.Game.gametype),
+                )
             )
-            db_game: models.Game | None = session.get(models.Game, db_poll.game_id)
-            home_team: models.Team | None = session.get(
-                models.Team, db_game.home_team_id
+            db_poll: models.Poll | None = session.scalars(stmt).first()
+            db_game: models.Game = db_poll.game
+            db_scaling: models.GameTypeScaling | None = session.get(
+                models.GameTypeScaling, (db_poll.channel_id, db_game.gametype_id)
             )
-            away_team: models.Team | None = session.get(
-                models.Team, db_game.away_team_id
+        home_team: models.Team = db_game.home_team
+        away_team: models.Team = db_game.away_team
+
+        channel = await self.get_or_fetch_channel(db_poll.channel_id)
+        poll = discord.Poll(
+            PollMedia(f"{home_team.name} - {away_team.name}"),
+            duration=(
+                db_game.kickoff
+                - datetime.datetime.now(UTC)
+                + datetime.timedelta(hours=1)
+            ),
+        )
+        # answer ids are Outcome + 1, so the order must stay HOME, AWAY, TIE
+        poll.add_answer(text=home_team.name, emoji=home_team.emoji_str)
+        poll.add_answer(text=away_team.name, emoji=away_team.emoji_str)
+        if db_game.gametype_id == "REG":
+            poll.add_answer(text="Tie", emoji="🤝")
+        try:
+            gametype_line = f"### 🏈   {db_game.gametype.name}"
+            if db_scaling and db_scaling.factor:
+                gametype_line += f" (Grants you {db_scaling.factor} point{'' if db_scaling.factor == 1 else 's'})"
+            kickoff_ts = int(db_game.kickoff.timestamp())
+            content = "\n".join(
+                [
+                    f"# {db_game.message_title}",
+                    gametype_line,
+                    f"### 📅   <t:{kickoff_ts}:F> ",
+                    f"### ⏳   <t:{kickoff_ts}:R>",
+                    "-# Polls may close early, so don't vote on the last second",
+                ]
             )
-
-            channel = await self.get_or_fetch_channel(db_channel.id)
-            poll = discord.Poll(
-                PollMedia(f"{home_team.name} - {away_team.name}"),
-                duration=(
-                    db_game.kickoff
-                    - datetime.datetime.now(datetime.timezone.utc)
-                    + datetime.timedelta(hours=1)
-                ),
+            msg = await channel.send(
+                content=content,
+                poll=poll,
             )
-            for answer in sorted(models.Outcome):
-                if answer == models.Outcome.HOME:
-                    poll.add_answer(text=home_team.name, emoji=home_team.emoji_str)
-                elif answer == models.Outcome.AWAY:
-                    poll.add_answer(text=away_team.name, emoji=away_team.emoji_str)
-                elif answer == models.Outcome.TIE and db_game.gametype_id == "REG":
-                    poll.add_answer(text="Tie", emoji="🤝")
-            try:
-                content = f"# {db_game.message_title}"
-                content += f"\n### 🏈   {db_game.gametype.name}"
-                db_scaling = session.get(
-                    models.GameTypeScaling, (db_channel.id, db_game.gametype_id)
-                )
-                if db_scaling and db_scaling.factor:
-                    content += f" (Grants you {db_scaling.factor} point{'' if db_scaling.factor == 1 else 's'})"
-                content += f"\n### 📅   <t:{int(db_game.kickoff.timestamp())}:F> "
-                content += f"\n### ⏳   <t:{int(db_game.kickoff.timestamp())}:R>"
-                content += (
-                    f"\n-# Polls may close early, so don't vote on the last second"
-                )
-                msg = await channel.send(
-                    content=content,
-                    poll=poll,
+            with Session(self.db) as session:
+                session.execute(
+                    update(models.Poll)
+                    .where(models.Poll.id == poll_id)
+                    .values(message_id=msg.id)
                 )
-                db_poll.message_id = msg.id
-                session.add(db_poll)
                 session.commit()
-                await msg.pin()
-            except HTTPException as e:
-                logger.error(e)
-
-    @tasks.loop(seconds=10)
-    async def create_new_polls(self):
-        new_polls: list[models.Poll] = []
-        channels_with_new_polls: set[models.Channel] = set()
+            await msg.pin()
+        except HTTPException as e:
+            logger.error(e)
+
+    @tasks.loop(seconds=60)
+    async def poll_tick(self):
+        new_polls: dict[int, list[int]] = {}  # channel.id: poll ids by kickoff
+        role_ids: dict[int, int | None] = {}  # channel.id: role.id
         with Session(self.db) as session:
             stmt = (
-                select(models.Poll)
+                select(models.Poll.id, models.Poll.channel_id, models.Channel.role_id)
                 .join(models.Channel)
                 .join(models.Game)
                 .where(models.Channel.active == True)
                 .where(models.Poll.message_id == None)
                 .order_by(models.Game.kickoff)
             )
-            for db_poll in session.scalars(stmt).all():
-                new_polls.append(db_poll)
-                channels_with_new_polls.add(db_poll.channel)
-        for db_channel in channels_with_new_polls:
-            channel = await self.get_or_fetch_channel(db_channel.id)
-            role = (
-                await channel.guild.fetch_role(db_channel.role_id)
-                if db_channel.role_id
-                else None
-            )
-            msg = await channel.send(
-                content=f"New Polls are incoming! Good luck everybody{' ' + role.mention if role else ''}",
-                allowed_mentions=discord.AllowedMentions.all(),
+            for poll_id, channel_id, role_id in session.execute(stmt).all():
+                new_polls.setdefault(channel_id, []).append(poll_id)
+                role_ids[channel_id] = role_id
+            self.load_delete_result_channels(session)
+        if self._listen_conn is None:
+            await self.listen_for_results()
+        await asyncio.gather(
+            self.create_new_polls(new_polls, role_ids),
+            self.post_pending_results(),
+        )
+
+    @staticmethod
+    def _connect_result_listener() -> psycopg2.extensions.connection:
+        conn = psycopg2.connect(settings.DB_CONNECTION_STRING)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute("LISTEN poll_result")
+        return conn
+
+    async def listen_for_results(self):
+        # tasks.update_games sends NOTIFY poll_result when a game gets a result
+        try:
+            # connecting blocks, keep it off the loop so the gateway heartbeat runs
+            conn = await asyncio.to_thread(self._connect_result_listener)
+        except psycopg2.Error as e:
+            logger.error(f"Could not listen for results: {e}")
+            return
+        self._listen_conn = conn
+        asyncio.get_running_loop().add_reader(conn.fileno(), self._on_result_notify)
+
+    def stop_listening_for_results(self):
+        conn, self._listen_conn = self._listen_conn, None
+        if conn is None:
+            return
+        asyncio.get_running_loop().remove_reader(conn.fileno())
+        conn.close()
+
+    def _on_result_notify(self):
+        try:
+            self._listen_conn.poll()
+        except psycopg2.Error as e:
+            # poll_tick reconnects, results are still picked up every minute
+            logger.error(f"Result listener failed: {e}")
+            self.stop_listening_for_results()
+            return
+        if self._listen_conn.notifies:
+            self._listen_conn.notifies.clear()
+            task = asyncio.create_task(self.post_pending_results())
+            self._result_tasks.add(task)
+            task.add_done_callback(self._result_tasks.discard)
+
+    async def post_pending_results(self):
+        # serialized so a NOTIFY and the poll tick never post the same result twice
+        async with self._results_lock:
+            with Session(self.db) as session:
+                stmt = (
+                    select(models.Poll.id)
+                    .join(models.Game)
+                    .join(models.Channel)
+                    .join(models.StateMessage)
+                    .where(models.Channel.active == True)
+                    .where(
+                        models.StateMessage.state
+                        != models.StateMessageState.RESULT_POSTED
+                    )
+                    .where(models.Game.result != None)
+                )
+                poll_ids = session.scalars(stmt).all()
+            await self.post_results(poll_ids)
+
+    @poll_tick.before_loop
+    async def before_poll_tick(self):
+        await self.wait_until_ready()
+
+    async def create_new_polls(
+        self, new_polls: dict[int, list[int]], role_ids: dict[int, int | None]
+    ):
+        # Channels are independent, but polls within a channel keep kickoff order
+        results = await asyncio.gather(
+            *(
+                self.post_channel_polls(channel_id, role_ids[channel_id], poll_ids)
+                for channel_id, poll_ids in new_polls.items()
+            ),
+            return_exceptions=True,
+        )
+        for channel_id, result in zip(new_polls, results):
+            if isinstance(result, Exception):
+                logger.error(f"Channel {channel_id}: {result}")
+
+    async def post_channel_polls(
+        self, channel_id: int, role_id: int | None, poll_ids: list[int]
+    ):
+        channel = await self.get_or_fetch_channel(channel_id)
+        role = await self.get_or_fetch_role(channel.guild, role_id) if role_id else None
+        await channel.send(
+            content=f"New Polls are incoming! Good luck everybody{' ' + role.mention if role else ''}",
+            allowed_mentions=discord.AllowedMentions.all(),
+        )
+        for poll_id in poll_ids:
+            await self.post_poll(poll_id)
+
+    async def close_poll(self, poll_id: int, channel_id: int, message_id: int) -> bool:
+        async with self._sync_sem:
+            try:
+                channel = await self.get_or_fetch_channel(channel_id)
+                message = await self.get_or_fetch_message(channel, message_id)
+                if not message.poll.is_finalised():
+                    await message.poll.end()
+                    self._msg_cache.pop(message.id, None)
+                return True
+            except Exception as e:
+                logger.error(f"Poll {poll_id}: {e}")
+                return False
+
+    @tasks.loop(hours=1)
+    async def cleanup_pins(self):
+        open_polls: dict[int, set[int]] = {}  # channel.id: open poll message ids
+        poll_messages: set[int] = set()
+        with Session(self.db) as session:
+            stmt = (
+                select(
+                    models.Poll.channel_id, models.Poll.message_id, models.Poll.closed
+                )
+                .join(models.Channel)
+                .where(models.Channel.active == True)
+                .where(models.Poll.message_id != None)
             )
-        for db_poll in new_polls:
-            await self.post_poll(db_poll.id)
+            for channel_id, message_id, closed in session.execute(stmt).all():
+                channel_polls = open_polls.setdefault(channel_id, set())
+                poll_messages.add(message_id)
+                if not closed:
+                    channel_polls.add(message_id)
+
+        for channel_id, open_message_ids in open_polls.items():
+            # Only the newest open polls stay pinned, closed ones are unpinned
+            keep = set(sorted(open_message_ids, reverse=True)[:10])
+            try:
+                channel = await self.get_or_fetch_channel(channel_id)
+                stale = [
+                    message
+                    async for message in channel.pins(limit=None)
+                    if message.id in poll_messages and message.id not in keep
+                ]
+                for message in stale:
+                    await message.unpin()
+            except HTTPException as e:
+                logger.error(f"Channel {channel_id}: {e}")
 
-    @create_new_polls.before_loop
-    async def before_create_new_polls(self):
+    @cleanup_pins.before_loop
+    async def before_cleanup_pins(self):
         await self.wait_until_ready()
 
     @tasks.loop(seconds=10)
     async def close_polls(self):
-        poll_ids: list[int] = []
         with Session(self.db) as session:
+            # database clock, so kickoffs compare without app/DB clock skew
+            now: datetime.datetime = session.scalar(select(func.now()))
             stmt = (
-                select(models.Poll)
+                select(models.Poll.id, models.Poll.channel_id, models.Poll.message_id)
                 .join(models.Game)
                 .where(models.Poll.closed == False)
-                .where(models.Game.kickoff <= datetime.datetime.now(ZoneInfo("UTC")))
+                .where(models.Game.kickoff <= now)
             )
-            for poll in session.scalars(stmt).all():
-                poll_ids.append(poll.id)
-                try:
-                    channel = await self.get_or_fetch_channel(poll.channel_id)
-                    message = await channel.fetch_message(poll.message_id)
-                    if not message.poll.is_finalised():
-                        await message.poll.end()
-                    poll.closed = True
-                    if message.pinned:
-                        await message.unpin()
-                except Exception as e:
-                    logger.error(f"Poll {poll.id}: {e}")
-                    continue
-            session.commit()
-        for poll_id in poll_ids:
-            await self.sync_poll_bets(poll_id)
+            polls = session.execute(stmt).all()
+        results = await asyncio.gather(*(self.close_poll(*poll) for poll in polls))
+        poll_ids = [poll.id for poll, closed in zip(polls, results) if closed]
+
+        with Session(self.db) as session:
+            if poll_ids:
+                session.execute(
+                    update(models.Poll)
+                    .where(models.Poll.id.in_(poll_ids))
+                    .values(closed=True)
+                )
+                session.commit()
+
+            # Wake up right at the next kickoff instead of polling every few seconds
+            stmt = (
+                select(func.min(models.Game.kickoff))
+                .join(models.Poll)
+                .where(models.Poll.closed == False)
+                .where(models.Game.kickoff > now)
+            )
+            next_kickoff: datetime.datetime | None = session.scalar(stmt)
+        # idle ticks are jittered so they drift apart from the other 60s loops
+        interval = 60 + random.uniform(0, 3)
+        if next_kickoff:
+            interval = max(5, min((next_kickoff - now).total_seconds(), interval))
+        self.close_polls.change_interval(seconds=interval)
+        await asyncio.gather(
+            *(self._safe_sync(poll_id, force=True) for poll_id in poll_ids)
+        )
 
     @close_polls.before_loop
     async def before_close_polls(self):
         await self.wait_until_ready()
 
-    @tasks.loop(seconds=10)
-    async def post_results(self):
-        polls: list[models.Poll] = []
+    async def post_result(self, poll_id: int):
+        async with self._sync_sem:
+            with Session(self.db) as session:
+                stmt = (
+                    select(models.Poll)
+                    .where(models.Poll.id == poll_id)
+                    .options(
+                        joinedload(models.Poll.game).joinedload(models.Game.home_team),
+                        joinedload(models.Poll.game).joinedload(models.Game.away_team),
+                        joinedload(models.Poll.game).joinedload(models.Game.gametype),
+                    )
+                )
+                poll: models.Poll | None = session.scalars(stmt).first()
+                if not poll:
+                    raise Exception("Poll not found")
+                db_game: models.Game = poll.game
+                db_scaling: models.GameTypeScaling | None = session.get(
+                    entity=models.GameTypeScaling,
+                    ident=(poll.channel_id, db_game.gametype_id),
+                )
+                stmt = (
+                    select(models.Bet)
+                    .where(models.Bet.game_id == poll.game_id)
+                    .where(models.Bet.choice == db_game.outcome)
+                    .where(models.Bet.channel_id == poll.channel_id)
+                    .options(joinedload(models.Bet.user))
+                )
+                winners: dict[int, str] = {
+                    db_bet.user_id: db_bet.user.username
+                    for db_bet in session.scalars(stmt).all()
+                }
+                state_message_id: int | None = poll.state_message_id
 
-        with Session(self.db) as session:
-            stmt = (
-                select(models.Poll)
-                .join(models.Game)
-                .join(models.Channel)
-                .join(models.StateMessage)
-                .where(models.Channel.active == True)
-                .where(
-                    models.StateMessage.state != models.StateMessageState.RESULT_POSTED
+            # Everything needed is loaded, the Discord calls below run without
+            # holding a database connection.
+            db_game_type: models.GameType = db_game.gametype
+            home_team: models.Team = db_game.home_team
+            away_team: models.Team = db_game.away_team
+            winner_team: models.Team = db_game.winner
+            channel = await self.get_or_fetch_channel(poll.channel_id)
+            poll_msg = await self.get_or_fetch_message(channel, poll.message_id)
+
+            embed = discord.Embed(
+                title="**Final Score**",
+                description=f"{db_game_type.name} ({db_scaling.factor} Otter Point{'' if db_scaling.factor == 1 else 's'})",
+                color=(
+                    discord.Colour.from_str(winner_team.color)
+                    if db_game.outcome != models.Outcome.TIE and db_game.winner.color
+                    else discord.Colour.blue()
+                ),
+                timestamp=datetime.datetime.now(UTC),
+            )
+            embed.add_field(
+                name=f"{home_team.emoji_str} {home_team.name}",
+                value=db_game.home_score,
+                inline=True,
+            )
+            embed.add_field(
+                name=f"{away_team.emoji_str} {away_team.name}",
+                value=db_game.away_score,
+                inline=True,
+            )
+            embed.set_thumbnail(
+                url=(
+                    db_game.winner.logo
+                    if db_game.winner
+                    else "https://static.wikia.nocookie.net/memepediadankmemes/images/c/cc/Wat8.jpg"
                 )
-                .where(models.Game.result != None)
             )
-            for poll in session.scalars(stmt).all():
-                polls.append(poll)
-
-        for db_poll in polls:
-            try:
-                with Session(self.db) as session:
-                    poll: models.Poll | None = session.get(models.Poll, db_poll.id)
-                    if not poll:
-                        raise Exception("Poll not found")
-                    channel = await self.get_or_fetch_channel(poll.channel_id)
-                    poll_msg = await channel.fetch_message(poll.message_id)
-                    db_state_message: models.StateMessage | None = session.get(
-                        entity=models.StateMessage,
-                        ident=db_poll.state_message_id,
-                    )
-                    db_game: models.Game | None = session.get(
-                        entity=models.Game,
-                        ident=db_poll.game_id,
-                    )
-                    db_game_type: models.GameType | None = session.get(
-                        entity=models.GameType,
-                        ident=db_game.gametype_id,
-                    )
-                    db_scaling: models.GameTypeScaling | None = session.get(
-                        entity=models.GameTypeScaling,
-                        ident=(db_poll.channel_id, db_game.gametype_id),
-                    )
-                    home_team: models.Team = db_game.home_team
-                    away_team: models.Team = db_game.away_team
-                    winner_team: models.Team = db_game.winner
 
-                    embed = discord.Embed(
-                        title="**Final Score**",
-                        description=f"{db_game_type.name} ({db_scaling.factor} Otter Point{'' if db_scaling.factor == 1 else 's'})",
-                        color=(
-                            discord.Colour.from_str(winner_team.color)
-                            if db_game.outcome != models.Outcome.TIE
-                            and db_game.winner.color
-                            else discord.Colour.blue()
-                        ),
-                        timestamp=datetime.datetime.now(ZoneInfo("UTC")),
-                    )
-                    embed.add_field(
-                        name=f"{home_team.emoji_str} {home_team.name}",
-                        value=db_game.home_score,
-                        inline=True,
-                    )
-                    embed.add_field(
-                        name=f"{away_team.emoji_str} {away_team.name}",
-                        value=db_game.away_score,
-                        inline=True,
+            members = await self.fetch_members(channel.guild, winners)
+            mentions = [
+                members[user_id].mention if user_id in members else username
+                for user_id, username in winners.items()
+            ]
+            footer_text = (
+                "GG " + ", ".join(mentions)
+                if mentions
+                else "nobody......... What is wrong with you guys?!"
+            )
+            embed.add_field(
+                name="---------",
+                value=footer_text,
+                inline=False,
+            )
+            if state_message_id:
+                state_message = await channel.fetch_message(state_message_id)
+                if len(state_message.content) > 0:
+                    await state_message.edit(
+                        content="",
+                        embed=embed,
+                        allowed_mentions=discord.AllowedMentions(users=True),
                     )
-                    embed.set_thumbnail(
-                        url=(
-                            db_game.winner.logo
-                            if db_game.winner
-                            else "https://static.wikia.nocookie.net/memepediadankmemes/images/c/cc/Wat8.jpg"
-                        )
+                else:
+                    await state_message.edit(
+                        embed=embed,
+                        allowed_mentions=discord.AllowedMentions(users=True),
                     )
+            else:
+                state_message = await poll_msg.reply(
+                    embed=embed,
+                    allowed_mentions=discord.AllowedMentions(users=True),
+                )
 
-                    stmt = (
-                        select(models.Bet)
-                        .where(models.Bet.game_id == db_poll.game_id)
-                        .where(models.Bet.choice == db_game.outcome)
-                        .where(models.Bet.channel_id == db_poll.channel_id)
-                    )
-                    footer_text = ""
-                    for db_bet in session.scalars(stmt).all():
-                        try:
-                            user = await self.get_or_fetch_user(db_bet.user_id)
-                            footer_text += f"{user.mention}, "
-                        except Exception as e:
-                            logger.error(e)
-                            footer_text += f"{db_bet.user.username}, "
-                            continue
-                    if len(footer_text) == 0:
-                        footer_text += "nobody......... What is wrong with you guys?!"
-                    else:
-                        footer_text = "GG " + footer_text[:-2]
-                    embed.add_field(
-                        name="---------",
-                        value=footer_text,
-                        inline=False,
-                    )
-                    if db_state_message:
-                        state_message = await channel.fetch_message(db_state_message.id)
-                        if len(state_message.content) > 0:
-                            await state_message.edit(
-                                content="",
-                                embed=embed,
-                                allowed_mentions=discord.AllowedMentions(users=True),
-                            )
-                        else:
-                            await state_message.edit(
-                                embed=embed,
-                                allowed_mentions=discord.AllowedMentions(users=True),
-                            )
-                        db_state_message.state = models.StateMessageState.RESULT_POSTED
-                    else:
-                        state_message = await poll_msg.reply(
-                            embed=embed,
-                            allowed_mentions=discord.AllowedMentions(users=True),
-                        )
-                        db_state_message = models.StateMessage(
+            with Session(self.db) as session:
+                db_state_message: models.StateMessage | None = session.get(
+                    models.StateMessage, state_message.id
+                )
+                if db_state_message:
+                    db_state_message.state = models.StateMessageState.RESULT_POSTED
+                else:
+                    session.add(
+                        models.StateMessage(
                             id=state_message.id,
                             state=models.StateMessageState.RESULT_POSTED,
                         )
-                        session.add(db_state_message)
-                        poll.state_message_id = db_state_message.id
-                    poll.result_posted = True
-                    session.commit()
-            except Exception as e:
-                logger.error(e)
-                continue
+                    )
+                session.execute(
+                    update(models.Poll)
+                    .where(models.Poll.id == poll_id)
+                    .values(state_message_id=state_message.id, result_posted=True)
+                )
+                session.commit()
 
-        if polls:
-            await self.post_leaderboards()
+    async def _safe_post_result(self, poll_id: int):
+        try:
+            await self.post_result(poll_id)
+        except Exception as e:
+            logger.error(e)
 
-    @post_results.before_loop
-    async def before_post_results(self):
-        await self.wait_until_ready()
+    async def post_results(self, poll_ids: list[int]):
+        await asyncio.gather(*(self._safe_post_result(poll_id) for poll_id in poll_ids))
+
+        if poll_ids:
+            await self.post_leaderboards()
 
     async def get_or_fetch_user(self, user_id: int):
         user = self.get_user(user_id)
@@ -558,283 +845,331 @@ class MyClient(discord.Client):
             user = await self.fetch_user(user_id)
         return user
 
+    async def fetch_members(
+        self, guild: discord.Guild, user_ids
+    ) -> dict[int, discord.Member]:
+        members: dict[int, discord.Member] = {}
+        missing: list[int] = []
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if member:
+                members[user_id] = member
+            else:
+                missing.append(user_id)
+        for i in range(0, len(missing), 100):
+            try:
+                for member in await guild.query_members(
+                    user_ids=missing[i : i + 100], limit=100
+                ):
+                    members[member.id] = member
+            except Exception as e:
+                logger.error(e)
+        return members
+
+    async def get_or_fetch_emoji(self, emoji_id: int):
+        emoji = self._emoji_cache.get(emoji_id)
+        if emoji is None:
+            emoji = await self.fetch_application_emoji(emoji_id)
+            self._emoji_cache[emoji.id] = emoji
+        return emoji
+
+    async def cache_application_emojis(self):
+        emojis = await self.fetch_application_emojis()
+        self._emoji_cache = {emoji.id: emoji for emoji in emojis}
+        return emojis
+
     async def get_or_fetch_channel(self, channel_id: int):
         channel = self.get_channel(channel_id)
         if channel is None:
             channel = await self.fetch_channel(channel_id)
         return channel
 
+    async def get_or_fetch_role(self, guild: discord.Guild, role_id: int):
+        role = guild.get_role(role_id)
+        if role is None:
+            role = await guild.fetch_role(role_id)
+        return role
+
+    async def get_or_fetch_message(
+        self, channel: discord.TextChannel, message_id: int, ttl: float = 30
+    ) -> discord.Message:
+        cached = self._msg_cache.get(message_id)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        message = await channel.fetch_message(message_id)
+        now = time.monotonic()
+        if len(self._msg_cache) >= 256:
+            self._msg_cache = {
+                k: v for k, v in self._msg_cache.items() if now - v[0] < ttl
+            }
+        self._msg_cache[message_id] = (now, message)
+        return message
+
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        self._msg_cache.pop(payload.message_id, None)
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self._msg_cache.pop(payload.message_id, None)
+
+    async def on_raw_poll_vote_add(self, payload: discord.RawPollVoteActionEvent):
+        self._msg_cache.pop(payload.message_id, None)
+
+    async def on_raw_poll_vote_remove(self, payload: discord.RawPollVoteActionEvent):
+        self._msg_cache.pop(payload.message_id, None)
+
     async def post_leaderboard_for_channel(self, channel_id: int):
-        leaderboard: dict[int, set[int]] = dict()
         with Session(self.db) as session:
             db_channel: models.Channel | None = session.get(models.Channel, channel_id)
             if not db_channel:
                 raise Exception("Channel not found")
+            leaderboard_msg_id = db_channel.leaderboard_msg_id
+            total_score = func.coalesce(func.sum(models.Bet.earned_points), 0).label(
+                "score"
+            )
             stmt = (
-                select(models.User)
+                select(models.User.id, models.User.username, total_score)
                 .join(models.Bet)
+                .join(models.Game, models.Bet.game_id == models.Game.id)
+                .outerjoin(
+                    models.GameTypeScaling,
+                    (models.GameTypeScaling.channel_id == models.Bet.channel_id)
+                    & (models.GameTypeScaling.gametype_id == models.Game.gametype_id),
+                )
                 .where(models.Bet.channel_id == channel_id)
+                .group_by(models.User.id)
+                .order_by(total_score.desc())
             )
-            for user in session.scalars(stmt).all():
-                user: models.User
-                score = 0
-                for bet in user.bets:
-                    if bet.channel_id == channel_id:
-                        score += bet.earned_points
-                if score in leaderboard:
-                    leaderboard[score].add(user.id)
-                else:
-                    leaderboard[score] = {user.id}
-            channel = await self.get_or_fetch_channel(channel_id)
-            embed = discord.Embed(
-                title="**Leaderboard**",
-                color=0x6434C9,
-                timestamp=datetime.datetime.now(ZoneInfo("UTC")),
-            )
-            embed_field_values: dict[int, str] = dict()
-            place = 1
-            for score, user_ids in sorted(
-                leaderboard.items(), key=lambda x: x[0], reverse=True
-            ):
-                users: list[discord.User] = []
-                for user_id in user_ids:
-                    users.append((await self.get_or_fetch_user(user_id)))
-                field_idx = place if place <= 10 else 11
-                if field_idx in embed_field_values:
-                    embed_field_values[field_idx] += "\n"
-                users_lines = []
-                for user in users:
-                    user_name = user.display_name
-                    if user_name == "Tephaine":
-                        emoji = await channel.guild.fetch_emoji(1413678151661518950)
-                        user_name = emoji
-                    users_lines.append(
-                        "> "
-                        + (f"`{place}.` " if place > 10 else "")
-                        + f"{user_name}: {score}"
-                    )
-                embed_field_values[field_idx] = embed_field_values.get(
-                    field_idx, ""
-                ) + "\n".join(users_lines)
-                place += len(user_ids)
-
-            for i in range(1, 11):
-                if i not in embed_field_values:
-                    embed_field_values[i] = "> ---"
-
-            for place, field_value in sorted(
-                embed_field_values.items(), key=lambda x: x[0]
-            ):
-                field_value = f"{field_value}"
-                match place:
-                    case 1:
-                        embed.add_field(
-                            name="🏆 1st Place", value=field_value, inline=True
-                        )
-                    case 2:
-                        embed.add_field(
-                            name="🥈 2nd Place", value=field_value, inline=True
-                        )
-                    case 3:
-                        embed.add_field(
-                            name="🥉 3rd Place", value=field_value, inline=True
-                        )
-                    case x if 3 < x <= 10:
-                        embed.add_field(
-                            name=f"{x}th Place", value=field_value, inline=True
-                        )
-                    case 11:
-                        embed.add_field(
-                            name=f"The Rest", value=field_value, inline=False
-                        )
-            logger.info(embed.to_dict())
-            if db_channel.leaderboard_msg_id:
-                msg = await channel.fetch_message(db_channel.leaderboard_msg_id)
-                await msg.edit(
-                    content=None,
-                    embed=embed,
-                    allowed_mentions=discord.AllowedMentions.none(),
+            rows = session.execute(stmt).all()
+        usernames: dict[int, str] = {row.id: row.username for row in rows}
+        # The session is closed here so no connection is held during Discord calls
+        channel = await self.get_or_fetch_channel(channel_id)
+        embed = discord.Embed(
+            title="**Leaderboard**",
+            color=0x6434C9,
+            timestamp=datetime.datetime.now(UTC),
+        )
+        embed_field_lines: dict[int, list[str]] = dict()
+        members = await self.fetch_members(channel.guild, usernames)
+        place = 1
+        for score, group in itertools.groupby(rows, key=lambda row: row.score):
+            user_ids = [row.id for row in group]
+            field_idx = place if place <= 10 else 11
+            users_lines = embed_field_lines.setdefault(field_idx, [])
+            for user_id in user_ids:
+                member = members.get(user_id)
+                user_name = member.display_name if member else usernames[user_id]
+                if user_name == "Tephaine":
+                    emoji = self.get_emoji(
+                        1413678151661518950
+                    ) or await channel.guild.fetch_emoji(1413678151661518950)
+                    user_name = emoji
+                users_lines.append(
+                    "> "
+                    + (f"`{place}.` " if place > 10 else "")
+                    + f"{user_name}: {score}"
                 )
-            else:
-                msg = await channel.send(
-                    embed=embed,
-                    allowed_mentions=discord.AllowedMentions.none(),
+            place += len(user_ids)
+
+        embed_field_values: dict[int, str] = {
+            i: "\n".join(embed_field_lines[i]) if i in embed_field_lines else "> ---"
+            for i in range(1, 11)
+        }
+        if 11 in embed_field_lines:
+            embed_field_values[11] = "\n".join(embed_field_lines[11])
+
+        for place, field_value in sorted(
+            embed_field_values.items(), key=lambda x: x[0]
+        ):
+            field_value = f"{field_value}"
+            match place:
+                case 1:
+                    embed.add_field(name="🏆 1st Place", value=field_value, inline=True)
+                case 2:
+                    embed.add_field(name="🥈 2nd Place", value=field_value, inline=True)
+                case 3:
+                    embed.add_field(name="🥉 3rd Place", value=field_value, inline=True)
+                case x if 3 < x <= 10:
+                    embed.add_field(name=f"{x}th Place", value=field_value, inline=True)
+                case 11:
+                    embed.add_field(name=f"The Rest", value=field_value, inline=False)
+        logger.info(embed.to_dict())
+        if leaderboard_msg_id:
+            msg = await channel.fetch_message(leaderboard_msg_id)
+            await msg.edit(
+                content=None,
+                embed=embed,
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        else:
+            msg = await channel.send(
+                embed=embed,
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+            with Session(self.db) as session:
+                session.execute(
+                    update(models.Channel)
+                    .where(models.Channel.id == channel_id)
+                    .values(leaderboard_msg_id=msg.id)
                 )
-                db_channel.leaderboard_msg_id = msg.id
-            session.commit()
+                session.commit()
 
     async def post_leaderboards(self):
-        channels: set[int] = set()
         with Session(self.db) as session:
-            stmt = select(models.Channel).where(models.Channel.active == True)
-            for channel in session.scalars(stmt).all():
-                channels.add(channel.id)
-        for channel_id in channels:
-            await self.post_leaderboard_for_channel(channel_id)
+            stmt = select(models.Channel.id).where(models.Channel.active == True)
+            channels = session.scalars(stmt).all()
+        results = await asyncio.gather(
+            *(self.post_leaderboard_for_channel(channel_id) for channel_id in channels),
+            return_exceptions=True,
+        )
+        for channel_id, result in zip(channels, results):
+            if isinstance(result, Exception):
+                logger.error(f"Leaderboard {channel_id}: {result}")
 
     async def update_all_bets(self):
-        found_user: set[int] = set()
-        db_polls: list[models.Poll] = []
         with Session(self.db) as session:
-            stmt = select(models.User)
-            for user in session.scalars(stmt).all():
-                found_user.add(user.id)
-            stmt = select(models.Poll).where(models.Poll.closed == False)
-            for db_poll in session.scalars(stmt).all():
-                db_polls.append(db_poll)
+            stmt = select(
+                models.Poll.id, models.Poll.channel_id, models.Poll.message_id
+            ).where(models.Poll.closed == False)
+            db_polls = session.execute(stmt).all()
 
-        logger.debug(f"{found_user=}")
-        logger.debug(f"{db_polls=}")
+        logger.debug("db_polls=%r", db_polls)
+        await asyncio.gather(
+            *(self._safe_sync(db_poll.id, force=True) for db_poll in db_polls)
+        )
+
+        closed_poll_ids: list[int] = []
         for db_poll in db_polls:
+            channel = await self.get_or_fetch_channel(db_poll.channel_id)
+            # the message was just fetched by the bet sync, so this hits the cache
+            message = await self.get_or_fetch_message(channel, db_poll.message_id)
+            if message.poll.victor_answer:
+                closed_poll_ids.append(db_poll.id)
+        if closed_poll_ids:
             with Session(self.db) as session:
-                db_poll: models.Poll | None = session.get(models.Poll, db_poll.id)
-                logger.debug(db_poll)
-                if not db_poll:
-                    raise Exception("Poll not found")
-                channel = await self.fetch_channel(db_poll.channel_id)
-                message = await channel.fetch_message(db_poll.message_id)
-                poll = message.poll
-                found_bets: dict[int, models.Bet] = {
-                    bet.user_id: bet for bet in db_poll.game.bets
-                }
-                logger.debug(f"{found_bets=}")
-
-                for answer in poll.answers:
-                    voters = [voter async for voter in answer.voters()]
-                    for voter in voters:
-                        if voter.id in found_bets.keys():
-                            bet = found_bets.pop(voter.id)
-                            bet.choice = answer.id - 1
-                        else:
-                            if voter.id not in found_user:
-                                user = await self.fetch_user(voter.id)
-                                db_user = models.User(id=user.id, username=user.name)
-                                session.add(db_user)
-                                found_user.add(user.id)
-                            db_bet = models.Bet(
-                                user_id=voter.id,
-                                game_id=db_poll.game_id,
-                                channel_id=db_poll.channel_id,
-                                choice=answer.id - 1,
-                            )
-                            session.add(db_bet)
-                for bet in found_bets.values():
-                    session.delete(bet)
-                if poll.victor_answer:
-                    db_poll.closed = True
+                session.execute(
+                    update(models.Poll)
+                    .where(models.Poll.id.in_(closed_poll_ids))
+                    .values(closed=True)
+                )
                 session.commit()
 
     async def init_db(self):
+        await asyncio.gather(self.populate_game_tables(), self.populate_all_teams())
+
+    async def populate_game_tables(self):
+        # scalings are seeded from the gametype table, so these stay ordered
         await self.populate_game_types()
         await self.populate_game_type_scaling()
-        await self.populate_all_teams()
 
-    async def populate_team(self, team: pd.Series, emoji: discord.Emoji | None = None):
+    async def populate_team_emoji(
+        self, team: typing.NamedTuple, emoji: discord.Emoji | None = None
+    ) -> discord.Emoji:
         if emoji is None:
-            response = httpx.get(team.team_logo_wikipedia, follow_redirects=True)
+            response = await self._http.get(team.team_logo_wikipedia)
             image = response.content
             emoji = await self.create_application_emoji(
                 name=team.team_abbr, image=image
             )
+            self._emoji_cache[emoji.id] = emoji
+        return emoji
+
+    async def populate_all_teams(self):
+        emojis = list(self._emoji_cache.values())
+        if not emojis:
+            emojis = await self.cache_application_emojis()
+
+        emoji_by_name: dict[str, discord.Emoji] = {}
+        for emoji in emojis:
+            emoji_by_name.setdefault(emoji.name, emoji)
+        if self._teams_df is None:
+            self._teams_df = await asyncio.to_thread(cached_team_desc)
+        columns = [
+            "team_id",
+            "team_abbr",
+            "team_name",
+            "team_color",
+            "team_logo_wikipedia",
+        ]
+        teams = list(self._teams_df[columns].itertuples(index=False))
+        semaphore = asyncio.Semaphore(4)
+
+        async def populate(team: typing.NamedTuple):
+            async with semaphore:
+                return await self.populate_team_emoji(
+                    team, emoji=emoji_by_name.get(team.team_abbr)
+                )
+
+        team_emojis = await asyncio.gather(*(populate(team) for team in teams))
+
         with Session(self.db) as session:
-            db_team: models.Team | None = session.get(models.Team, team.team_abbr)
-            if db_team:
-                db_team.name = team.team_name
-                db_team.logo = team.team_logo_wikipedia
-                db_team.emoji_id = emoji.id
-                db_team.emoji_str = str(emoji)
-                db_team.color = team.team_color
-            else:
-                db_team = models.Team(
-                    id=team.team_abbr,
-                    name=team.team_name,
-                    logo=team.team_logo_wikipedia,
-                    emoji_id=emoji.id,
-                    emoji_str=str(emoji),
-                    color=team.team_color,
+            stmt = insert(models.Team).values(
+                [
+                    {
+                        "id": team.team_abbr,
+                        "name": team.team_name,
+                        "logo": team.team_logo_wikipedia,
+                        "emoji_id": emoji.id,
+                        "emoji_str": str(emoji),
+                        "color": team.team_color,
+                    }
+                    for team, emoji in zip(teams, team_emojis)
+                ]
+            )
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[models.Team.id],
+                    set_={
+                        "name": stmt.excluded.name,
+                        "logo": stmt.excluded.logo,
+                        "emoji_id": stmt.excluded.emoji_id,
+                        "emoji_str": stmt.excluded.emoji_str,
+                        "color": stmt.excluded.color,
+                    },
                 )
-                session.add(db_team)
-            stmt = (
-                select(models.TeamIdentifier)
-                .where(models.TeamIdentifier.external_id == str(team.team_id))
-                .where(models.TeamIdentifier.source == models.ApiSource.NFL_DATA_PY)
             )
-            if session.scalars(stmt).first() is None:
-                session.add(
-                    models.TeamIdentifier(
-                        team_id=db_team.id,
-                        external_id=str(team.team_id),
-                        source=models.ApiSource.NFL_DATA_PY,
-                    )
+            session.execute(
+                insert(models.TeamIdentifier)
+                .values(
+                    [
+                        {
+                            "team_id": team.team_abbr,
+                            "external_id": str(team.team_id),
+                            "source": models.ApiSource.NFL_DATA_PY,
+                        }
+                        for team in teams
+                    ]
                 )
+                .on_conflict_do_nothing(constraint="uq_team_source_external_id")
+            )
             session.commit()
 
-    async def populate_all_teams(self):
-        emojis = await self.fetch_application_emojis()
-
-        for team in nfl.import_team_desc().iloc:
-            team_emoji = None
-            for emoji in emojis:
-                if emoji.name == team.team_abbr:
-                    team_emoji = emoji
-                    break
-            await self.populate_team(team, emoji=team_emoji)
-
     async def populate_game_types(self):
         game_types = [
-            models.GameType(
-                id="REG",
-                name="Regular Season",
-            ),
-            models.GameType(
-                id="DIV",
-                name="Divisional Round",
-            ),
-            models.GameType(
-                id="WC",
-                name="Wild Card Round",
-            ),
-            models.GameType(
-                id="CON",
-                name="Conference Championship",
-            ),
-            models.GameType(
-                id="SB",
-                name="Super Bowl",
-            ),
+            {"id": "REG", "name": "Regular Season"},
+            {"id": "DIV", "name": "Divisional Round"},
+            {"id": "WC", "name": "Wild Card Round"},
+            {"id": "CON", "name": "Conference Championship"},
+            {"id": "SB", "name": "Super Bowl"},
         ]
         with Session(self.db) as session:
-            for game_type in game_types:
-                try:
-                    db_game_type: models.GameType | None = session.get(
-                        models.GameType, game_type.id
-                    )
-                    if db_game_type:
-                        return
-                    session.add(game_type)
-                    session.commit()
-                except Exception as e:
-                    logger.error(e)
+            try:
+                session.execute(
+                    insert(models.GameType).values(game_types).on_conflict_do_nothing()
+                )
+                session.commit()
+            except Exception as e:
+                logger.error(e)
 
     async def populate_game_type_scaling(self):
         with Session(self.db) as session:
-            stmt = select(models.GameType)
-            game_types = session.scalars(stmt).all()
-            stmt = select(models.Channel)
-            channels = session.scalars(stmt).all()
-            for game_type in game_types:
-                for channel in channels:
-                    game_type_scaling: models.GameTypeScaling | None = session.get(
-                        models.GameTypeScaling, (channel.id, game_type.id)
-                    )
-                    if game_type_scaling:
-                        continue
-                    game_type_scaling = models.GameTypeScaling(
-                        channel_id=channel.id,
-                        gametype_id=game_type.id,
-                        factor=1,
-                    )
-                    session.add(game_type_scaling)
+            stmt = select(models.Channel.id, models.GameType.id, literal(1)).join(
+                models.GameType, true()
+            )
+            session.execute(
+                insert(models.GameTypeScaling)
+                .from_select(["channel_id", "gametype_id", "factor"], stmt)
+                .on_conflict_do_nothing()
+            )
             session.commit()
 
     async def fix_poll_message_header(self):
@@ -856,16 +1191,18 @@ class MyClient(discord.Client):
 
     async def on_ready(self):
         print(f"Logged on as {self.user}!")
+        await self.cache_application_emojis()
+        for guild in self.guilds:
+            if not guild.chunked:
+                await guild.chunk(cache=True)
         await self.init_db()
-        async for guild in self.fetch_guilds():
-            roles = await guild.fetch_roles()
-            for role in roles:
-                print(f"{guild.name}: {role} ({role.id}) {role.members}#")
-            channels = await guild.fetch_channels()
-            for channel in channels:
-                print(f"{guild.name}: {channel} ({channel.id})")
+        if logger.isEnabledFor(logging.DEBUG):
+            for guild in self.guilds:
+                for role in guild.roles:
+                    logger.debug(f"{guild.name}: {role} ({role.id}) {role.members}#")
+                for channel in guild.channels:
+                    logger.debug(f"{guild.name}: {channel} ({channel.id})")
         # await self.update_all_bets()
-        print("LOL1")
         # await self.fix_poll_message_header()
         await self.post_leaderboards()
         # await self.upgrade_result_to_status()
@@ -882,15 +1219,11 @@ class MyClient(discord.Client):
                 case discord.MessageType.default:
                     pass
                 case discord.MessageType.poll_result | discord.MessageType.pins_add:
-                    with Session(self.db) as session:
-                        db_channel: models.Channel | None = session.get(
-                            models.Channel, message.channel.id
-                        )
-                        if db_channel.delete_result_msg:
-                            await message.delete()
+                    if message.channel.id in self._delete_result_channels:
+                        await message.delete()
 
-        logger.debug(f"Message from {message.author}: {message.content}")
-        logger.debug(f"Channel: {message.channel.id}")
+        logger.debug("Message from %s: %s", message.author, message.content)
+        logger.debug("Channel: %s", message.channel.id)
 
 
 def main():
@@ -899,7 +1232,18 @@ def main():
     intents.members = True
     intents.messages = True
 
-    engine = create_engine(settings.DB_CONNECTION_STRING, echo=False)
+    engine = create_engine(
+        settings.DB_CONNECTION_STRING,
+        echo=settings.SQL_ECHO,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_use_lifo=True,
+        # multi-row VALUES upserts get one cache entry per row count
+        query_cache_size=1200,
+    )
     models.Base.metadata.create_all(engine)
 
     client = MyClient(intents=intents, db_engine=engine)
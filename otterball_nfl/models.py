@@ -4,6 +4,7 @@ import datetime
 import enum
 
 from sqlalchemy import (
+    Computed,
     ForeignKey,
     DateTime,
     String,
@@ -13,10 +14,14 @@ from sqlalchemy import (
     Integer,
     and_,
     or_,
+    case,
     UniqueConstraint,
+    Index,
     select,
+    text,
 )
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -143,7 +148,14 @@ class Game(Base):
     away_score: Mapped[int] = mapped_column(Integer, nullable=True)
     result: Mapped[int] = mapped_column(Integer, nullable=True)
     outcome: Mapped[Outcome] = mapped_column(
-        Enum(Outcome), default=Outcome.NOT_FINISHED
+        Enum(Outcome),
+        Computed(
+            "CASE WHEN result IS NULL THEN 'NOT_FINISHED'::outcome "
+            "WHEN result = 0 THEN 'TIE'::outcome "
+            "WHEN result < 0 THEN 'AWAY'::outcome "
+            "ELSE 'HOME'::outcome END",
+            persisted=True,
+        ),
     )
     gametype_id: Mapped[str] = mapped_column(ForeignKey("gametype.id"))
     kickoff: Mapped[datetime.datetime] = mapped_column(
@@ -174,6 +186,8 @@ class Game(Base):
         cascade="all, delete-orphan",
     )
 
+    __table_args__ = (Index("ix_game_kickoff", "kickoff"),)
+
     @property
     def message_title(self) -> str:
         return f"{self.home_team.emoji_str} {self.home_team.name} - {self.away_team.name} {self.away_team.emoji_str}"
@@ -196,13 +210,33 @@ class Game(Base):
             return self.away_team
         return None
 
-    @property
+    @hybrid_property
+    def winner_id(self) -> str | None:
+        return {
+            Outcome.HOME: self.home_team_id,
+            Outcome.AWAY: self.away_team_id,
+        }.get(self.outcome)
+
+    @winner_id.expression
+    def winner_id(cls):
+        return case(
+            (cls.outcome == Outcome.HOME, cls.home_team_id),
+            (cls.outcome == Outcome.AWAY, cls.away_team_id),
+        )
+
+    @hybrid_property
     def winner_score(self) -> int | None:
-        if self.outcome == Outcome.HOME:
-            return self.home_score
-        elif self.outcome == Outcome.AWAY:
-            return self.away_score
-        return None
+        return {
+            Outcome.HOME: self.home_score,
+            Outcome.AWAY: self.away_score,
+        }.get(self.outcome)
+
+    @winner_score.expression
+    def winner_score(cls):
+        return case(
+            (cls.outcome == Outcome.HOME, cls.home_score),
+            (cls.outcome == Outcome.AWAY, cls.away_score),
+        )
 
     @property
     def loser(self) -> Team | None:
@@ -212,13 +246,33 @@ class Game(Base):
             return self.home_team
         return None
 
-    @property
+    @hybrid_property
+    def loser_id(self) -> str | None:
+        return {
+            Outcome.HOME: self.away_team_id,
+            Outcome.AWAY: self.home_team_id,
+        }.get(self.outcome)
+
+    @loser_id.expression
+    def loser_id(cls):
+        return case(
+            (cls.outcome == Outcome.HOME, cls.away_team_id),
+            (cls.outcome == Outcome.AWAY, cls.home_team_id),
+        )
+
+    @hybrid_property
     def loser_score(self) -> int | None:
-        if self.outcome == Outcome.HOME:
-            return self.away_score
-        elif self.outcome == Outcome.AWAY:
-            return self.home_score
-        return None
+        return {
+            Outcome.HOME: self.away_score,
+            Outcome.AWAY: self.home_score,
+        }.get(self.outcome)
+
+    @loser_score.expression
+    def loser_score(cls):
+        return case(
+            (cls.outcome == Outcome.HOME, cls.away_score),
+            (cls.outcome == Outcome.AWAY, cls.home_score),
+        )
 
 
 class GameIdentifier(Base):
@@ -236,6 +290,7 @@ class GameIdentifier(Base):
 
     __table_args__ = (
         UniqueConstraint("source", "external_id", name="uq_game_source_external_id"),
+        Index("ix_game_identifier_game", "game_id"),
     )
 
 
@@ -301,6 +356,14 @@ class StateMessage(Base):
         uselist=False,
     )
 
+    __table_args__ = (
+        Index(
+            "ix_state_message_pending",
+            "id",
+            postgresql_where=text("state != 'RESULT_POSTED'"),
+        ),
+    )
+
 
 class Poll(Base):
     __tablename__ = "poll"
@@ -328,6 +391,12 @@ class Poll(Base):
 
     __table_args__ = (
         UniqueConstraint("channel_id", "game_id", name="uq_poll_channel_game"),
+        Index("ix_poll_open", "game_id", postgresql_where=text("NOT closed")),
+        Index(
+            "ix_poll_unposted",
+            "channel_id",
+            postgresql_where=text("message_id IS NULL"),
+        ),
     )
 
 
@@ -364,7 +433,8 @@ class Bet(Base):
             GameTypeScaling.channel_id == channel_id,
             Game.id == game_id,
         )
-        .scalar_subquery()
+        .scalar_subquery(),
+        deferred=True,
     )
 
     user: Mapped[User] = relationship(
@@ -381,10 +451,22 @@ class Bet(Base):
         UniqueConstraint(
             "user_id", "game_id", "channel_id", name="uq_bet_user_game_channel"
         ),
+        Index("ix_bet_game_channel", "game_id", "channel_id"),
     )
 
-    @property
-    def earned_points(self):
+    @hybrid_property
+    def earned_points(self) -> int:
         if self.choice == self.game.outcome:
-            return self.possible_points
+            return self.possible_points or 0
         return 0
+
+    @earned_points.expression
+    def earned_points(cls):
+        # expects Game and GameTypeScaling to be joined for the bet
+        return case(
+            (
+                and_(cls.choice == Game.outcome, GameTypeScaling.factor != None),
+                GameTypeScaling.factor,
+            ),
+            else_=0,
+        )
@@ -10,6 +10,7 @@ POSTGRES_HOSTNAME = environ.get("POSTGRES_HOSTNAME", "db")
 POSTGRES_PORT = environ.get("POSTGRES_PORT", 5432)
 DB_CONNECTION_STRING = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOSTNAME}:{POSTGRES_PORT}/{POSTGRES_DB}"
 # DB_CONNECTION_STRING = "sqlite:///db.sqlite3"
+SQL_ECHO = environ.get("SQL_ECHO", "false").lower() == "true"
 
 RABBITMQ_HOSTNAME = environ.get("RABBITMQ_HOSTNAME", "rabbitmq")
 RABBITMQ_USER = environ.get("RABBITMQ_DEFAULT_USER")
@@ -17,6 +18,13 @@ RABBITMQ_PASS = environ.get("RABBITMQ_DEFAULT_PASS")
 RABBITMQ_VHOST = environ.get("RABBITMQ_DEFAULT_VHOST", "my_vhost")
 RABBITMQ_PORT = environ.get("RABBITMQ_NODE_PORT", 5672)
 CELERY_BROKER_URL = f"amqp://{RABBITMQ_USER}:{RABBITMQ_PASS}@{RABBITMQ_HOSTNAME}:{RABBITMQ_PORT}/{RABBITMQ_VHOST}"
+# e.g. "rediss://:password@redis:6380/0?ssl_cert_reqs=required"
+CELERY_RESULT_BACKEND = environ.get(
+    "CELERY_RESULT_BACKEND", "db+" + DB_CONNECTION_STRING
+)
+
+TEAM_DESC_CACHE = environ.get("TEAM_DESC_CACHE", "~/.cache/otterball/teams.parquet")
+TEAM_DESC_CACHE_TTL = int(environ.get("TEAM_DESC_CACHE_TTL", 86400))
 
 match environ.get("LOG_LEVEL", "INFO"):
     case "DEBUG":
@@ -1,13 +1,14 @@
+import asyncio
 import datetime
-from zoneinfo import ZoneInfo
+from collections import defaultdict
 
 import nfl_data_py as nfl
 import pandas as pd
 import httpx
 from celery import Celery, Task, signals
 from celery.utils.log import get_task_logger
-from numpy import isnan
-from sqlalchemy import create_engine, select
+from sqlalchemy import create_engine, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from otterball_nfl import settings, models
@@ -16,110 +17,139 @@ from otterball_nfl.models import Game
 logger = get_task_logger(__name__)
 logger.setLevel(settings.LOG_LEVEL)
 
-engine = create_engine(settings.DB_CONNECTION_STRING, echo=False)
+UTC = datetime.timezone.utc
+
+# Every prefork child runs one task at a time, so it only ever needs a couple
+# of connections. Keep concurrency * (pool_size + max_overflow) below the
+# server's max_connections together with the bot's pool.
+engine = create_engine(
+    settings.DB_CONNECTION_STRING,
+    echo=False,
+    pool_size=2,
+    max_overflow=2,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    pool_use_lifo=True,
+    query_cache_size=1200,
+)
 
 app = Celery("tasks", broker=settings.CELERY_BROKER_URL)
 app.config_from_object("otterball_nfl.celeryconfig")
 
 
+@signals.worker_process_init.connect
+def reset_engine_pool(*args, **kwargs):
+    # connections inherited from the parent must not be shared with the child
+    engine.dispose(close=False)
+
+
+@signals.worker_process_shutdown.connect
+def close_engine_pool(*args, **kwargs):
+    engine.dispose()
+
+
 @app.task(bind=True, ignore_result=True)
 def update_games(self: Task, season: int):
     games = nfl.import_schedules([season])
-    games["datetime_str"] = games["gameday"] + " " + games["gametime"]
-    games["kickoff"] = pd.to_datetime(games["datetime_str"], format="%Y-%m-%d %H:%M")
-    games["kickoff"] = games["kickoff"].dt.tz_localize(ZoneInfo("America/New_York"))
-    games["kickoff_utc"] = games["kickoff"].dt.tz_convert(ZoneInfo("UTC"))
+    kickoff = pd.to_datetime(games["gameday"], format="%Y-%m-%d") + pd.to_timedelta(
+        games["gametime"] + ":00"
+    )
+    games["kickoff_utc"] = kickoff.dt.tz_localize("America/New_York").dt.tz_convert(
+        "UTC"
+    )
 
+    scores = ["home_score", "away_score", "result"]
+    games[scores] = games[scores].astype("Int64")
+    games = games[
+        ["game_id", "game_type", "home_team", "away_team", *scores, "kickoff_utc"]
+    ].rename(
+        columns={
+            "game_id": "id",
+            "game_type": "gametype_id",
+            "home_team": "home_team_id",
+            "away_team": "away_team_id",
+            "kickoff_utc": "kickoff",
+        }
+    )
+    rows: list[dict] = (
+        games.astype(object).where(games.notna(), None).to_dict(orient="records")
+    )
+
+    finished_games: list[str] = []
     with Session(engine) as session:
-        for game in games.iloc:
-            try:
-                db_game = session.get(Game, game.game_id)
-                if db_game:
-                    if not isnan(game.home_score):
-                        db_game.home_score = int(game.home_score)
-                    if not isnan(game.away_score):
-                        db_game.away_score = int(game.away_score)
-                    db_game.kickoff = game.kickoff_utc
-                    db_game.result = (
-                        int(game.result) if not isnan(game.result) else None
-                    )
-                    db_game.outcome = models.Outcome.from_result(db_game.result)
-                else:
-                    db_game = Game(
-                        id=game.game_id,
-                        gametype_id=game.game_type,
-                        home_team_id=game.home_team,
-                        away_team_id=game.away_team,
-                        home_score=(
-                            int(game.home_score) if not isnan(game.home_score) else None
-                        ),
-                        away_score=(
-                            int(game.away_score) if not isnan(game.away_score) else None
-                        ),
-                        kickoff=game.kickoff_utc,
-                        result=int(game.result) if not isnan(game.result) else None,
-                    )
-                    db_game.outcome = models.Outcome.from_result(db_game.result)
-                    session.add(db_game)
-                stmt = (
-                    select(models.GameIdentifier)
-                    .where(models.GameIdentifier.source == models.ApiSource.NFL_DATA_PY)
-                    .where(models.GameIdentifier.external_id == str(game.game_id))
-                )
-                if session.scalars(stmt).first() is None:
-                    session.add(
-                        models.GameIdentifier(
-                            game_id=db_game.id,
-                            external_id=str(game.game_id),
-                            source=models.ApiSource.NFL_DATA_PY,
-                        )
-                    )
-            except Exception as e:
-                print(e)
-                continue
-            if game.kickoff_utc < pd.Timestamp.now(ZoneInfo("UTC")):
-                stmt = (
-                    select(models.Poll)
-                    .where(models.Poll.game_id == game.game_id)
-                    .where(models.Poll.closed == False)
-                )
-                for poll in session.scalars(stmt).all():
-                    pass
+        stmt = select(Game.id, Game.result).where(Game.id.in_(games["id"].tolist()))
+        known_results = dict(session.execute(stmt).all())
+        for game in rows:
+            if (
+                game["result"] is not None
+                and game["id"] in known_results
+                and known_results[game["id"]] is None
+            ):
+                finished_games.append(game["id"])
+        if not rows:
+            return
+
+        stmt = insert(Game).values(rows)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Game.id],
+                set_={
+                    # a missing score in the schedule keeps the one we already have
+                    "home_score": func.coalesce(
+                        stmt.excluded.home_score, Game.home_score
+                    ),
+                    "away_score": func.coalesce(
+                        stmt.excluded.away_score, Game.away_score
+                    ),
+                    "kickoff": stmt.excluded.kickoff,
+                    "result": stmt.excluded.result,
+                },
+            )
+        )
+        session.execute(
+            insert(models.GameIdentifier)
+            .values(
+                [
+                    {
+                        "game_id": row["id"],
+                        "external_id": str(row["id"]),
+                        "source": models.ApiSource.NFL_DATA_PY,
+                    }
+                    for row in rows
+                ]
+            )
+            .on_conflict_do_nothing(constraint="uq_game_source_external_id")
+        )
+        # delivered to the bot's LISTEN poll_result when the transaction commits
+        for game_id in finished_games:
+            session.execute(select(func.pg_notify("poll_result", game_id)))
         session.commit()
 
 
 @app.task(bind=True, ignore_result=True)
 def create_polls(self: Task):
     logger.info("Creating polls")
-    with Session(engine) as session:
-        stmt = select(models.Channel).where(models.Channel.active == True)
-        channels: set[models.Channel] = set(session.scalars(stmt).all())
-        stmt = select(models.Game).where(
-            models.Game.kickoff.between(
-                datetime.datetime.now(ZoneInfo("UTC")),
-                datetime.datetime.now(ZoneInfo("UTC")) + datetime.timedelta(days=7),
-            )
+    now = datetime.datetime.now(UTC)
+    games = (
+        select(
+            models.Channel.id,
+            models.Game.id,
+            literal(False),
+            literal(False),
         )
-        for game in session.scalars(stmt).all():
-            print(game.id)
-            for channel in channels:
-                print(channel.id)
-                stmt = (
-                    select(models.Poll)
-                    .where(models.Poll.game_id == game.id)
-                    .where(models.Poll.channel_id == channel.id)
-                )
-                if session.scalars(stmt).first():
-                    logger.info(f"Poll already exists for {game.id} in {channel.id}")
-                    continue
-                session.add(
-                    models.Poll(
-                        channel=channel,
-                        game=game,
-                        closed=False,
-                        result_posted=False,
-                    )
-                )
+        .join(models.Game, true())
+        .where(models.Channel.active == True)
+        .where(models.Game.kickoff.between(now, now + datetime.timedelta(days=7)))
+    )
+    stmt = (
+        insert(models.Poll)
+        .from_select(["channel_id", "game_id", "closed", "result_posted"], games)
+        .on_conflict_do_nothing(constraint="uq_poll_channel_game")
+        .returning(models.Poll.game_id, models.Poll.channel_id)
+    )
+    with Session(engine) as session:
+        for game_id, channel_id in session.execute(stmt).all():
+            logger.info(f"Created poll for {game_id} in {channel_id}")
         session.commit()
 
 
@@ -131,7 +161,7 @@ def update_scores(self: Task):
             .join(models.GameIdentifier)
             .where(models.GameIdentifier.source == models.ApiSource.ESPN_V2)
             .where(models.Game.outcome == models.Outcome.NOT_FINISHED)
-            .where(models.Game.kickoff <= datetime.datetime.now(ZoneInfo("UTC")))
+            .where(models.Game.kickoff <= datetime.datetime.now(UTC))
             .order_by(models.Game.kickoff)
         )
         db_games = list(session.scalars(stmt).all())
@@ -149,37 +179,40 @@ def update_scores(self: Task):
             response = client.get(
                 f"https://site.web.api.espn.com/apis/fantasy/v2/games/ffl/games?dates={first_kickoff.strftime(datefmt)}-{last_kickoff.strftime(datefmt)}&pbpOnly=true"
             )
-            for event in response.json()["events"]:
-                if event["status"].lower() in ["pre", "post"]:
-                    continue
-                stmt = (
-                    select(models.Game)
-                    .join(models.GameIdentifier)
-                    .where(models.GameIdentifier.source == models.ApiSource.ESPN_V2)
-                    .where(models.GameIdentifier.external_id == event["competitionId"])
+            events = [
+                event
+                for event in response.json()["events"]
+                if event["status"].lower() not in ["pre", "post"]
+            ]
+            if not events:
+                return
+            stmt = (
+                select(models.GameIdentifier.external_id, models.Game)
+                .join(models.GameIdentifier.game)
+                .where(models.GameIdentifier.source == models.ApiSource.ESPN_V2)
+                .where(
+                    models.GameIdentifier.external_id.in_(
+                        [event["competitionId"] for event in events]
+                    )
                 )
-                db_game: models.Game | None = session.scalars(stmt).first()
+            )
+            games_by_event: dict[str, models.Game] = dict(session.execute(stmt).all())
+            stmt = (
+                select(models.TeamIdentifier.external_id, models.Team)
+                .join(models.TeamIdentifier.team)
+                .where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
+            )
+            teams: dict[str, models.Team] = dict(session.execute(stmt).all())
+            for event in events:
+                db_game = games_by_event.get(event["competitionId"])
                 if db_game is None:
                     continue
                 home_team = event["competitors"][0]
                 away_team = event["competitors"][1]
                 if home_team["homeAway"] == "away":
                     home_team, away_team = away_team, home_team
-                stmt = (
-                    select(models.Team)
-                    .join(models.TeamIdentifier)
-                    .where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
-                    .where(models.TeamIdentifier.external_id == str(home_team["id"]))
-                )
-                db_home_team = session.scalars(stmt).first()
-
-                stmt = (
-                    select(models.Team)
-                    .join(models.TeamIdentifier)
-                    .where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
-                    .where(models.TeamIdentifier.external_id == str(away_team["id"]))
-                )
-                db_away_team = session.scalars(stmt).first()
+                db_home_team = teams.get(str(home_team["id"]))
+                db_away_team = teams.get(str(away_team["id"]))
 
                 if db_home_team is None or db_away_team is None:
                     if db_home_team is None:
@@ -223,26 +256,26 @@ def update_espn_teams(*args, **kwargs):
         )
         teams = response.json()["sports"][0]["leagues"][0]["teams"]
         with Session(engine) as session:
+            stmt = select(models.TeamIdentifier.external_id).where(
+                models.TeamIdentifier.source == models.ApiSource.ESPN_V2
+            )
+            known_teams = set(session.scalars(stmt))
+            team_ids = set(session.scalars(select(models.Team.id)))
             for team in teams:
                 team = team["team"]
-                stmt = (
-                    select(models.TeamIdentifier)
-                    .where(models.TeamIdentifier.external_id == str(team["id"]))
-                    .where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
-                )
-                if session.scalars(stmt).first():
+                if str(team["id"]) in known_teams:
                     continue
 
-                db_team = session.get(models.Team, str(team["abbreviation"]).upper())
-                if db_team is None:
+                team_id = str(team["abbreviation"]).upper()
+                if team_id not in team_ids:
                     logger.error(
-                        f"Team {team["name"]} ({team['abbreviation']}) not found"
+                        f"Team {team['name']} ({team['abbreviation']}) not found"
                     )
                     continue
 
                 session.add(
                     models.TeamIdentifier(
-                        team_id=db_team.id,
+                        team_id=team_id,
                         external_id=str(team["id"]),
                         source=models.ApiSource.ESPN_V2,
                     )
@@ -250,115 +283,100 @@ def update_espn_teams(*args, **kwargs):
             session.commit()
 
 
+async def fetch_espn_scoreboards(years: set[int]) -> list[list[dict]]:
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=10)) as client:
+        responses = await asyncio.gather(
+            *(
+                client.get(
+                    f"https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard?limit=1000&dates={year}"
+                )
+                for year in years
+            )
+        )
+    return [response.json()["events"] for response in responses]
+
+
 @signals.worker_ready.connect
 def update_espn_games(*args, **kwargs):
-    missing_years: set[int] = set()
     with Session(engine) as session:
-        stmt = (
-            select(models.Game)
-            .where(
-                ~models.Game.identifiers.any(
-                    models.GameIdentifier.source == models.ApiSource.ESPN_V2
-                )
+        stmt = select(models.Game.kickoff).where(
+            ~models.Game.identifiers.any(
+                models.GameIdentifier.source == models.ApiSource.ESPN_V2
             )
-            .order_by(models.Game.kickoff)
         )
-        for db_game in session.scalars(stmt).all():
-            missing_years.add(db_game.kickoff.year)
-    if len(missing_years) == 0:
-        return
-    with httpx.Client() as client:
-        for year in missing_years:
-            response = client.get(
-                f"https://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard?limit=1000&dates={year}"
-            )
-            with Session(engine) as session:
-                for event in response.json()["events"]:
-                    if event["name"].lower().startswith("tbd"):
-                        continue
-                    stmt = (
-                        select(models.GameIdentifier)
-                        .where(models.GameIdentifier.source == models.ApiSource.ESPN_V2)
-                        .where(models.GameIdentifier.external_id == str(event["id"]))
-                    )
-                    if session.scalars(stmt).first():
-                        continue
-                    competition = event["competitions"][0]
-                    kickoff = datetime.datetime.fromisoformat(competition["startDate"])
-                    home_team = competition["competitors"][0]
-                    away_team = competition["competitors"][1]
-                    if home_team["homeAway"] == "away":
-                        home_team, away_team = away_team, home_team
-
-                    stmt = (
-                        select(models.Team)
-                        .join(models.TeamIdentifier)
-                        .where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
-                        .where(
-                            models.TeamIdentifier.external_id
-                            == str(home_team["team"]["id"])
-                        )
-                    )
-                    db_home_team = session.scalars(stmt).first()
-
-                    stmt = (
-                        select(models.Team)
-                        .join(models.TeamIdentifier)
-                        .where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
-                        .where(
-                            models.TeamIdentifier.external_id
-                            == str(away_team["team"]["id"])
-                        )
-                    )
-                    db_away_team = session.scalars(stmt).first()
-
-                    if db_home_team is None or db_away_team is None:
-                        if db_home_team is None:
-                            logger.error(
-                                f"Home team {home_team['team'].get('name', home_team)} not found"
-                            )
-                        if db_away_team is None:
-                            logger.error(
-                                f"Away team {away_team['team'].get('name', away_team)} not found"
-                            )
-                        continue
-
-                    stmt = (
-                        select(models.Game)
-                        .where(models.Game.home_team_id == db_home_team.id)
-                        .where(models.Game.away_team_id == db_away_team.id)
-                        .where(
-                            models.Game.kickoff.between(
-                                kickoff - datetime.timedelta(hours=24),
-                                kickoff + datetime.timedelta(hours=24),
-                            )
-                        )
-                    )
-                    db_game = session.scalars(stmt).first()
-                    if db_game is None:
-                        # Maybe teams are switched?
-                        stmt = (
-                            select(models.Game)
-                            .where(models.Game.home_team_id == db_away_team.id)
-                            .where(models.Game.away_team_id == db_home_team.id)
-                            .where(
-                                models.Game.kickoff.between(
-                                    kickoff - datetime.timedelta(hours=24),
-                                    kickoff + datetime.timedelta(hours=24),
-                                )
-                            )
-                        )
-                        db_game = session.scalars(stmt).first()
-                    if db_game is None:
+        missing_years = {kickoff.year for kickoff in session.scalars(stmt)}
+        if len(missing_years) == 0:
+            return
+        stmt = select(
+            models.TeamIdentifier.external_id, models.TeamIdentifier.team_id
+        ).where(models.TeamIdentifier.source == models.ApiSource.ESPN_V2)
+        team_ids: dict[str, str] = dict(session.execute(stmt).all())
+        stmt = select(models.GameIdentifier.external_id).where(
+            models.GameIdentifier.source == models.ApiSource.ESPN_V2
+        )
+        known_events = set(session.scalars(stmt))
+        games_by_teams: dict[tuple[str, str], list] = defaultdict(list)
+        stmt = select(
+            models.Game.id,
+            models.Game.home_team_id,
+            models.Game.away_team_id,
+            models.Game.kickoff,
+        )
+        for game_id, home_team_id, away_team_id, game_kickoff in session.execute(stmt):
+            games_by_teams[(home_team_id, away_team_id)].append((game_kickoff, game_id))
+
+    def find_game(home_team_id: str, away_team_id: str, kickoff: datetime.datetime):
+        for game_kickoff, game_id in games_by_teams.get(
+            (home_team_id, away_team_id), []
+        ):
+            if abs(game_kickoff - kickoff) <= datetime.timedelta(hours=24):
+                return game_id
+        return None
+
+    # years are independent, so fetch them all at once and write sequentially
+    for events in asyncio.run(fetch_espn_scoreboards(missing_years)):
+        with Session(engine) as session:
+            for event in events:
+                if event["name"].lower().startswith("tbd"):
+                    continue
+                if str(event["id"]) in known_events:
+                    continue
+                competition = event["competitions"][0]
+                kickoff = datetime.datetime.fromisoformat(competition["startDate"])
+                home_team = competition["competitors"][0]
+                away_team = competition["competitors"][1]
+                if home_team["homeAway"] == "away":
+                    home_team, away_team = away_team, home_team
+
+                home_team_id = team_ids.get(str(home_team["team"]["id"]))
+                away_team_id = team_ids.get(str(away_team["team"]["id"]))
+
+                if home_team_id is None or away_team_id is None:
+                    if home_team_id is None:
                         logger.error(
-                            f"Game not found for {home_team['team']['displayName']} ({db_home_team.id}) vs {away_team['team']['displayName']} ({db_away_team.id}) at {kickoff}"
+                            f"Home team {home_team['team'].get('name', home_team)} not found"
                         )
-                        continue
-                    session.add(
-                        models.GameIdentifier(
-                            game_id=db_game.id,
-                            source=models.ApiSource.ESPN_V2,
-                            external_id=str(event["id"]),
+                    if away_team_id is None:
+                        logger.error(
+                            f"Away team {away_team['team'].get('name', away_team)} not found"
                         )
+                    continue
+
+                game_id = find_game(home_team_id, away_team_id, kickoff)
+                if game_id is None:
+                    # Maybe teams are switched?
+                    game_id = find_game(away_team_id, home_team_id, kickoff)
+                if game_id is None:
+                    logger.error(
+                        f"Game not found for {home_team['team']['displayName']} ({home_team_id}) vs {away_team['team']['displayName']} ({away_team_id}) at {kickoff}"
                     )
-                session.commit()
+                    continue
+                session.add(
+                    models.GameIdentifier(
+                        game_id=game_id,
+                        source=models.ApiSource.ESPN_V2,
+                        external_id=str(event["id"]),
+                    )
+                )
+                known_events.add(str(event["id"]))
+            session.commit()